@@ -0,0 +1,157 @@
+"""複数スレッドから index() と artist_details を呼び出したときのスループットを計測する。
+
+使い方 (リポジトリのルートで実行):
+    python benchmarks/bench_concurrency.py
+
+spotify_stub のデータを返すローカルのHTTPサーバーを Spotify API の代わりに起動し、
+アプリの HTTP セッション (コネクションプール) を経由して呼び出させる。
+1, 8, 32 スレッドから一覧ページとアーティストページを交互に要求し、
+スループット (件/秒) と p95 レイテンシを表示する。比較用に、毎回 client_lock を
+取得する従来の get_spotify_client() でも同じ計測を行う。
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spotipy import Spotify  # noqa: E402
+
+from spotify_stub import StubSpotify, make_artist, make_track  # noqa: E402
+from spotify_stub import _AuthManager  # noqa: E402
+
+import usviral50  # noqa: E402
+
+THREADS = (1, 8, 32)
+REQUESTS_PER_RUN = 192
+PLAYLIST_SIZE = 100
+API_LATENCY = 0.005  # スタブAPIの1回あたりの応答時間 (秒)
+
+stub = StubSpotify(PLAYLIST_SIZE)
+
+
+def full_artist(artist_id):
+    return stub.artists([artist_id])["artists"][0]
+
+
+# パスとクエリからスタブのレスポンスを作る
+def stub_response(path, query):
+    parts = path.strip("/").split("/")[1:]  # 先頭の "v1" を除く
+    ids = query.get("ids", [""])[0].split(",")
+    fields = query.get("fields", [None])[0]
+    if parts[0] == "playlists" and len(parts) == 2:
+        return stub.playlist(parts[1], fields=fields)
+    if parts[0] == "playlists" and parts[2] == "tracks":
+        offset = int(query.get("offset", ["0"])[0])
+        limit = int(query.get("limit", ["100"])[0])
+        return stub.playlist_tracks(parts[1], offset=offset, limit=limit, fields=fields)
+    if parts == ["audio-features"]:
+        return {"audio_features": stub.audio_features(ids)}
+    if parts == ["tracks"]:
+        return stub.tracks(ids)
+    if parts == ["artists"]:
+        return stub.artists(ids)
+    if parts == ["albums"]:
+        return stub.albums(ids)
+    if parts[0] == "artists" and len(parts) == 2:
+        return full_artist(parts[1])
+    if parts[0] == "artists" and parts[2] == "top-tracks":
+        return {"tracks": [make_track(i) for i in range(10)]}
+    if parts[0] == "artists" and parts[2] == "albums":
+        albums = [stub.tracks([f"{i * 12:022d}"])["tracks"][0]["album"] for i in range(5)]
+        return {"items": albums, "total": len(albums), "next": None}
+    if parts[0] == "artists" and parts[2] == "related-artists":
+        return {"artists": [dict(make_artist(i), images=[]) for i in range(20)]}
+    return None
+
+
+class StubAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # コネクションを使い回せるようにする
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        body = stub_response(url.path, parse_qs(url.query))
+        time.sleep(API_LATENCY)
+        data = json.dumps(body).encode("utf-8") if body is not None else b"{}"
+        self.send_response(200 if body is not None else 404)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_api():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubAPIHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+# 従来の get_spotify_client (作成済みでも毎回ロックを取得する)
+def locked_get_spotify_client():
+    with usviral50.client_lock:
+        return usviral50.spotify_client
+
+
+def request_paths(run):
+    # エンティティのキャッシュに当たらないよう、要求ごとに別のIDを使う
+    for n in range(REQUESTS_PER_RUN):
+        key = f"{run}{n:06d}"
+        if n % 2:
+            yield f"/?playlist_id=bench{key}"
+        else:
+            yield f"/artist/ar{int(key):020d}"
+
+
+def run(threads, run_id):
+    local = threading.local()
+
+    def fetch(path):
+        if not hasattr(local, "client"):
+            local.client = usviral50.app.test_client()
+        start = time.perf_counter()
+        response = local.client.get(path)
+        response.get_data()  # ストリーミングのレスポンスを最後まで読む
+        assert response.status_code == 200, (path, response.status_code)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = sorted(executor.map(fetch, request_paths(run_id)))
+    elapsed = time.perf_counter() - start
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    return len(latencies) / elapsed, p95
+
+
+def main():
+    api_base = start_stub_api()
+    client = Spotify(auth_manager=_AuthManager(), requests_session=usviral50.http_session)
+    client.prefix = f"{api_base}/"
+    usviral50.SPOTIFY_API_BASE = api_base
+    usviral50.spotify_client = client
+    usviral50.app.config["TESTING"] = True
+    lock_free = usviral50.get_spotify_client
+
+    run(4, 0)  # テンプレートのコンパイルなどを除外するためのウォームアップ
+    print(f"{'threads':>7} {'client':>10} {'throughput':>14} {'p95':>10}")
+    run_id = 1
+    for threads in THREADS:
+        for label, getter in (("locked", locked_get_spotify_client), ("lock-free", lock_free)):
+            usviral50.get_spotify_client = getter
+            throughput, p95 = run(threads, run_id)
+            run_id += 1
+            print(f"{threads:>7} {label:>10} {throughput:>10.1f} r/s {p95 * 1000:>7.1f} ms")
+    usviral50.get_spotify_client = lock_free
+
+
+if __name__ == "__main__":
+    main()
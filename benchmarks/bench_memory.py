@@ -0,0 +1,95 @@
+"""index() の1リクエストあたりのピークメモリを計測する。
+
+使い方 (リポジトリのルートで実行):
+    python benchmarks/bench_memory.py
+
+スタブのSpotifyクライアントで 500曲と 2,000曲のプレイリストを返し、
+tracemalloc でリクエスト全体 (ストリーミングの消費まで) のピークを計測する。
+比較用に、全ページの生データを保持してから整形する従来方式のピークも表示する。
+"""
+
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from legacy_transform import get_track_info  # noqa: E402
+from spotify_stub import StubSpotify  # noqa: E402
+
+import usviral50  # noqa: E402
+
+SIZES = (500, 2000)
+
+
+def measure(func):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def reset_caches():
+    usviral50.hydrated_tracks = usviral50.TTLCache(64, 600)
+    usviral50.track_cache = usviral50.TTLCache(4096, 3600)
+    usviral50.audio_features_cache = usviral50.TTLCache(8192, 3600)
+    usviral50.artist_cache = usviral50.TTLCache(2048, 3600)
+    usviral50.artist_genre_cache = usviral50.TTLCache(16384, 3600)
+    usviral50.row_fragment_cache = usviral50.TTLCache(8192, 3600)
+
+
+def request_index(client, size):
+    # sort=bpm で全トラックのハイドレーションを強制する
+    response = client.get(f"/?playlist_id=bench{size}&sort=bpm")
+    body = b"".join(response.response)
+    assert response.status_code == 200, response.status_code
+    return len(body)
+
+
+def legacy_buffer_all(sp, size):
+    # 従来方式: 全ページの生データを保持した後で、まとめて整形する
+    with usviral50.app.test_request_context():
+        raw_items = []
+        for offset in range(0, size, 100):
+            raw_items.extend(sp.playlist_tracks("legacy", offset=offset)["items"])
+        track_ids = [item["track"]["id"] for item in raw_items]
+        features = {}
+        for i in range(0, len(track_ids), 50):
+            for feature in sp.audio_features(track_ids[i:i + 50]):
+                features[feature["id"]] = feature
+        rows = [
+            get_track_info(item["track"], features[item["track"]["id"]])
+            for item in raw_items
+        ]
+        return len(rows)
+
+
+def main():
+    usviral50.app.config["TESTING"] = True
+    client = usviral50.app.test_client()
+    print(f"{'tracks':>8} {'pipeline peak':>15} {'legacy peak':>15}")
+    for size in SIZES:
+        usviral50.MAX_TRACKS = size
+        sp = StubSpotify(size)
+        usviral50.spotify_client = sp
+        reset_caches()
+        request_index(client, size)  # テンプレートのコンパイルなどを除外するためのウォームアップ
+
+        reset_caches()
+        pipeline_peak = measure(lambda: request_index(client, size))
+
+        reset_caches()
+        legacy_peak = measure(lambda: legacy_buffer_all(sp, size))
+        print(
+            f"{size:>8} {pipeline_peak / 1024 / 1024:>12.2f} MB"
+            f" {legacy_peak / 1024 / 1024:>12.2f} MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""fieldsパラメーターによるペイロードの削減量を計測する。
+
+使い方 (リポジトリのルートで実行):
+    python benchmarks/bench_payload.py
+
+スタブのSpotifyクライアントが返すプレイリストのレスポンスを JSON に変換し、
+fields なし (全項目) と usviral50 の宣言した fields ありで、
+転送されるバイト数と json.loads の所要時間を比較する。
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spotify_stub import StubSpotify  # noqa: E402
+
+import usviral50  # noqa: E402
+
+SIZES = (100, 500, 2000)
+REPEAT = 5
+
+
+def playlist_payloads(sp, size, projected):
+    # index() と同じ順序で、プレイリストの詳細とトラックのページを取得する
+    playlist_fields = usviral50.PLAYLIST_FIELDS if projected else None
+    tracks_fields = usviral50.PLAYLIST_TRACKS_FIELDS if projected else None
+    payloads = [json.dumps(sp.playlist("bench", fields=playlist_fields)).encode()]
+    for offset in range(0, size, 100):
+        page = sp.playlist_tracks("bench", fields=tracks_fields, offset=offset, limit=100)
+        payloads.append(json.dumps(page).encode())
+    return payloads
+
+
+def parse_time(payloads):
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for payload in payloads:
+            json.loads(payload)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    print(
+        f"{'tracks':>8} {'full bytes':>12} {'fields bytes':>13} {'saved':>7}"
+        f" {'full parse':>11} {'fields parse':>13}"
+    )
+    for size in SIZES:
+        sp = StubSpotify(size)
+        full = playlist_payloads(sp, size, projected=False)
+        projected = playlist_payloads(sp, size, projected=True)
+        full_bytes = sum(len(p) for p in full)
+        projected_bytes = sum(len(p) for p in projected)
+        print(
+            f"{size:>8} {full_bytes:>12,} {projected_bytes:>13,}"
+            f" {1 - projected_bytes / full_bytes:>6.0%}"
+            f" {parse_time(full) * 1000:>8.2f} ms {parse_time(projected) * 1000:>10.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
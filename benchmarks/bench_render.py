@@ -0,0 +1,71 @@
+"""トラック一覧の行の描画時間を、全件描画と行キャッシュ経由で比較する。
+
+使い方 (リポジトリのルートで実行):
+    python benchmarks/bench_render.py
+
+スタブのSpotifyクライアントで 100曲、500曲、2,000曲のトラック情報を用意し、
+全行をテンプレートで描画する場合と、render_track_rows() で行のHTMLキャッシュを
+使う場合 (キャッシュが空の初回と、キャッシュ済みの2回目以降) の所要時間を比較する。
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import render_template_string  # noqa: E402
+
+from spotify_stub import StubSpotify  # noqa: E402
+
+import usviral50  # noqa: E402
+
+SIZES = (100, 500, 2000)
+REPEAT = 5
+
+# 行キャッシュを使わずに、全行を1つのテンプレートで描画する
+FULL_RENDER_TEMPLATE = '{% for track in tracks %}{% include "track_row.html" %}{% endfor %}'
+
+
+def load_rows(size):
+    sp = StubSpotify(size)
+    usviral50.MAX_TRACKS = size
+    usviral50.spotify_client = sp
+    pages = usviral50.iter_playlist_pages(sp, "bench")
+    return list(usviral50.iter_track_rows(sp, pages))
+
+
+def best_time(func, reset=None):
+    best = None
+    for _ in range(REPEAT):
+        if reset:
+            reset()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def reset_fragments():
+    usviral50.row_fragment_cache = usviral50.TTLCache(8192, 3600)
+
+
+def main():
+    print(f"{'rows':>6} {'full':>10} {'fragment cold':>15} {'fragment warm':>15}")
+    with usviral50.app.test_request_context():
+        for size in SIZES:
+            rows = load_rows(size)
+            render_template_string(FULL_RENDER_TEMPLATE, tracks=rows[:1])  # コンパイルを除外
+
+            full = best_time(lambda: render_template_string(FULL_RENDER_TEMPLATE, tracks=rows))
+            cold = best_time(lambda: usviral50.render_track_rows(rows), reset=reset_fragments)
+            warm = best_time(lambda: usviral50.render_track_rows(rows))
+            print(
+                f"{size:>6} {full * 1000:>7.1f} ms {cold * 1000:>12.1f} ms"
+                f" {warm * 1000:>12.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
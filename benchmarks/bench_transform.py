@@ -0,0 +1,77 @@
+"""トラック情報の整形 (オーディオ特性の結合まで) の1曲あたりの時間を計測する。
+
+使い方 (リポジトリのルートで実行):
+    python benchmarks/bench_transform.py
+
+スタブのトラック辞書とオーディオ特性を 500曲と 5,000曲分用意し、
+従来の1曲ずつの整形 (legacy_transform.get_track_info) と、現在の
+100曲のページ単位の整形 (shape_tracks + apply_audio_features_page) の
+1曲あたりの時間を比較する。
+一部のトラックは画像なし (デフォルト画像を使う) にしている。
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from legacy_transform import get_track_info  # noqa: E402
+from spotify_stub import make_audio_features, make_track  # noqa: E402
+
+import usviral50  # noqa: E402
+
+SIZES = (500, 5000)
+PAGE_SIZE = 100
+REPEAT = 5
+
+
+# 1ページ分の生のトラック辞書とオーディオ特性から、表示用のトラック情報をまとめて作る
+# (アプリのパイプラインの段階2と段階3)
+def transform_track_page(tracks, features_by_id):
+    return usviral50.apply_audio_features_page(usviral50.shape_tracks(tracks), features_by_id)
+
+
+def make_inputs(size):
+    tracks = [make_track(i) for i in range(size)]
+    for track in tracks[::10]:
+        track["album"]["images"] = []
+    features = {track["id"]: make_audio_features(track["id"]) for track in tracks}
+    return tracks, features
+
+
+def per_track(tracks, features):
+    return [get_track_info(track, features[track["id"]]) for track in tracks]
+
+
+def batched(tracks, features):
+    rows = []
+    for i in range(0, len(tracks), PAGE_SIZE):
+        rows.extend(transform_track_page(tracks[i:i + PAGE_SIZE], features))
+    return rows
+
+
+def best_time(func, tracks, features):
+    best = None
+    for _ in range(REPEAT):
+        with usviral50.app.test_request_context():
+            start = time.perf_counter()
+            func(tracks, features)
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    print(f"{'tracks':>7} {'per-track':>14} {'batched':>14}")
+    for size in SIZES:
+        tracks, features = make_inputs(size)
+        single = best_time(per_track, tracks, features)
+        batch = best_time(batched, tracks, features)
+        print(
+            f"{size:>7} {single / size * 1e6:>9.2f} us/tr {batch / size * 1e6:>9.2f} us/tr"
+        )
+
+
+if __name__ == "__main__":
+    main()
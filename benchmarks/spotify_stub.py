@@ -0,0 +1,233 @@
+"""ベンチマーク用の決定的なSpotifyクライアントのスタブ。
+
+実際のAPIと同程度の大きさのオブジェクト (available_markets、アルバム情報など) を
+返すため、メモリ使用量やペイロードの計測に使える。ネットワークには接続しない。
+"""
+
+MARKETS = [
+    "AD", "AE", "AR", "AT", "AU", "BE", "BG", "BO", "BR", "CA", "CH", "CL", "CO",
+    "CR", "CY", "CZ", "DE", "DK", "DO", "EC", "EE", "ES", "FI", "FR", "GB", "GR",
+    "GT", "HK", "HN", "HU", "ID", "IE", "IL", "IN", "IS", "IT", "JP", "LI", "LT",
+    "LU", "LV", "MC", "MT", "MX", "MY", "NI", "NL", "NO", "NZ", "PA", "PE", "PH",
+    "PL", "PT", "PY", "RO", "SE", "SG", "SK", "SV", "TH", "TR", "TW", "US", "UY",
+    "VN", "ZA",
+]
+
+
+def parse_fields(fields):
+    """Spotifyのfields構文 ("a,b.c,d(e,f)") を入れ子の辞書に変換する"""
+    tree = {}
+    stack = [tree]
+    name = ""
+
+    def add():
+        node = stack[-1]
+        for part in name.split(".")[:-1]:
+            node = node.setdefault(part, {})
+        leaf = name.split(".")[-1]
+        node.setdefault(leaf, {})
+        return node[leaf]
+
+    for char in fields:
+        if char == ",":
+            if name:
+                add()
+            name = ""
+        elif char == "(":
+            stack.append(add())
+            name = ""
+        elif char == ")":
+            if name:
+                add()
+            stack.pop()
+            name = ""
+        else:
+            name += char.strip()
+    if name:
+        add()
+    return tree
+
+
+def project(value, tree):
+    """parse_fieldsの結果に従ってオブジェクトの項目を絞り込む"""
+    if not tree or value is None:
+        return value
+    if isinstance(value, list):
+        return [project(item, tree) for item in value]
+    return {key: project(value[key], sub) for key, sub in tree.items() if key in value}
+
+
+class _AuthManager:
+    def get_access_token(self, as_dict=False):
+        return "stub-token"
+
+
+def track_id(i):
+    return f"{i:022d}"
+
+
+def make_artist(i):
+    artist_id = f"ar{i:020d}"
+    return {
+        "external_urls": {"spotify": f"https://open.spotify.com/artist/{artist_id}"},
+        "href": f"https://api.spotify.com/v1/artists/{artist_id}",
+        "id": artist_id,
+        "name": f"Artist {i}",
+        "type": "artist",
+        "uri": f"spotify:artist:{artist_id}",
+    }
+
+
+def make_album(i):
+    album_id = f"al{i:020d}"
+    return {
+        "album_type": "album",
+        "artists": [make_artist(i % 97)],
+        "available_markets": list(MARKETS),
+        "external_urls": {"spotify": f"https://open.spotify.com/album/{album_id}"},
+        "href": f"https://api.spotify.com/v1/albums/{album_id}",
+        "id": album_id,
+        "images": [
+            {"height": size, "width": size, "url": f"https://i.scdn.co/image/ab67{i:036d}{size}"}
+            for size in (640, 300, 64)
+        ],
+        "name": f"Album {i}",
+        "release_date": f"20{i % 25:02d}-01-01",
+        "release_date_precision": "day",
+        "total_tracks": 12,
+        "type": "album",
+        "uri": f"spotify:album:{album_id}",
+    }
+
+
+def make_track(i):
+    tid = track_id(i)
+    return {
+        "album": make_album(i // 12),
+        "artists": [make_artist(i % 97), make_artist((i + 1) % 97)],
+        "available_markets": list(MARKETS),
+        "disc_number": 1,
+        "duration_ms": 180000 + i,
+        "explicit": bool(i % 2),
+        "external_ids": {"isrc": f"JPXX{i:08d}"},
+        "external_urls": {"spotify": f"https://open.spotify.com/track/{tid}"},
+        "href": f"https://api.spotify.com/v1/tracks/{tid}",
+        "id": tid,
+        "is_local": False,
+        "name": f"Track {i}",
+        "popularity": i % 100,
+        "preview_url": f"https://p.scdn.co/mp3-preview/{tid}",
+        "track_number": i % 12 + 1,
+        "type": "track",
+        "uri": f"spotify:track:{tid}",
+    }
+
+
+def make_audio_features(tid):
+    i = int(tid)
+    return {
+        "acousticness": 0.1,
+        "analysis_url": f"https://api.spotify.com/v1/audio-analysis/{tid}",
+        "danceability": 0.6,
+        "duration_ms": 180000 + i,
+        "energy": 0.7,
+        "id": tid,
+        "instrumentalness": 0.0,
+        "key": i % 12,
+        "liveness": 0.1,
+        "loudness": -6.5,
+        "mode": i % 2,
+        "speechiness": 0.05,
+        "tempo": 80 + i % 90 + 0.25,
+        "time_signature": 4,
+        "track_href": f"https://api.spotify.com/v1/tracks/{tid}",
+        "type": "audio_features",
+        "uri": f"spotify:track:{tid}",
+        "valence": 0.4,
+    }
+
+
+class StubSpotify:
+    """spotipy.Spotify のうち、アプリが使うメソッドだけを持つスタブ"""
+
+    def __init__(self, playlist_size=500):
+        self.playlist_size = playlist_size
+        self.auth_manager = _AuthManager()
+
+    def playlist(self, playlist_id, market=None, fields=None, **kwargs):
+        result = {
+            "description": "Benchmark playlist",
+            "external_urls": {"spotify": f"https://open.spotify.com/playlist/{playlist_id}"},
+            "followers": {"href": None, "total": 1234},
+            "id": playlist_id,
+            "images": [{"height": 640, "width": 640, "url": "https://i.scdn.co/image/pl"}],
+            "name": f"Benchmark {self.playlist_size}",
+            "snapshot_id": f"snapshot-{self.playlist_size}",
+            "tracks": {
+                "total": self.playlist_size,
+                "items": self.playlist_tracks(playlist_id)["items"],
+            },
+        }
+        return project(result, parse_fields(fields)) if fields else result
+
+    def playlist_tracks(self, playlist_id, offset=0, limit=100, market=None, fields=None, **kwargs):
+        stop = min(offset + limit, self.playlist_size)
+        items = [
+            {
+                "added_at": "2024-01-01T00:00:00Z",
+                "added_by": {"id": "user", "type": "user", "uri": "spotify:user:user"},
+                "is_local": False,
+                "track": make_track(i),
+            }
+            for i in range(offset, stop)
+        ]
+        result = {
+            "items": items,
+            "limit": limit,
+            "next": None if stop >= self.playlist_size else "next",
+            "offset": offset,
+            "total": self.playlist_size,
+        }
+        return project(result, parse_fields(fields)) if fields else result
+
+    playlist_items = playlist_tracks
+
+    def audio_features(self, tracks):
+        return [make_audio_features(tid) for tid in tracks]
+
+    def tracks(self, tracks, market=None):
+        return {"tracks": [make_track(int(tid)) for tid in tracks]}
+
+    def track(self, track_id, market=None):
+        return make_track(int(track_id))
+
+    def artists(self, artists):
+        return {
+            "artists": [
+                dict(
+                    make_artist(int(artist_id[2:])),
+                    followers={"href": None, "total": 1000},
+                    genres=["j-pop"],
+                    images=[],
+                    popularity=50,
+                )
+                for artist_id in artists
+            ]
+        }
+
+    def albums(self, albums, market=None):
+        return {
+            "albums": [
+                dict(
+                    make_album(int(album_id[2:])),
+                    label="Benchmark Records",
+                    tracks={
+                        "items": [
+                            make_track(int(album_id[2:]) * 12 + n) for n in range(12)
+                        ],
+                        "total": 12,
+                    },
+                )
+                for album_id in albums
+            ]
+        }
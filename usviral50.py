@@ -1,26 +1,62 @@
 # 標準ライブラリ
+import atexit  # 終了時の処理
+import base64  # Base64エンコード/デコード
+import array  # 整数の配列 (関連アーティストの隣接リスト)
+import binascii  # Base64デコードのエラー
+import csv  # CSV形式の書き出し
+import fcntl  # プロセス間のファイルロック (画像キャッシュ)
+import gzip  # gzip圧縮
+import hashlib  # ハッシュ値の計算
+import io  # 文字列バッファ
 import json  # JSON形式データのエンコード/デコード
 import logging  # ロギング機能
+import math  # 数学関数
+import mimetypes  # ファイル拡張子からMIMEタイプを判定
 import os  # OSレベルの機能を扱う
+import signal  # 終了シグナルの処理
+import statistics  # 平均値や分位数の計算
+import tempfile  # 一時ファイル
+import threading  # バックグラウンドスレッド
 import time  # 時間に関する機能
+import zlib  # ストリーミング用の逐次圧縮
 import requests
+from requests.adapters import HTTPAdapter  # コネクションプールの設定
+from urllib3.util.retry import Retry  # 再試行の設定
+from collections import OrderedDict  # 挿入順を保持する辞書
 from collections import defaultdict  # デフォルト値を持つ辞書
+from contextlib import contextmanager  # with文で使うロックの定義
 
 
 # Flask関連ライブラリ
 from flask import Flask  # Flask本体
+from flask import Response  # レスポンスオブジェクト
+from flask import abort  # HTTPエラーの送出
+from flask import copy_current_request_context  # 別スレッドでのリクエスト情報の利用
+from flask import g  # リクエストごとの値の保持
+from flask import has_request_context  # リクエスト処理中かどうか
 from flask import jsonify  # JSONレスポンス生成
+from flask import make_response  # レスポンスオブジェクト生成
 from flask import render_template  # HTMLテンプレートレンダリング
+from flask import redirect  # リダイレクト
 from flask import request  # HTTPリクエストオブジェクト
+from flask import send_file  # ファイル送信
 from flask import send_from_directory  # ファイル送信
+from flask import stream_template  # テンプレートのストリーミング描画
+from flask import stream_with_context  # ジェネレーターでリクエスト情報を使う
 from flask import url_for  # URL生成
+from jinja2 import FileSystemBytecodeCache  # テンプレートのバイトコードキャッシュ
+from markupsafe import Markup  # エスケープ済みHTML
+from werkzeug.security import safe_join  # 安全なパス結合
 
 # Spotify APIクライアント
 from spotipy.oauth2 import SpotifyClientCredentials  # Spotify OAuth2認証
 from spotipy import Spotify  # Spotify API本体
+from spotipy.exceptions import SpotifyException  # Spotify APIのエラー
 
 from threading import Lock
 from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor  # バックグラウンドの先読み
+from concurrent.futures import TimeoutError as FuturesTimeoutError  # 待ち時間の超過
 
 
 # 環境変数を一度だけ読み取る。これらの変数はAPI認証に使用される。
@@ -31,6 +67,12 @@ SPOTIFY_CLIENT_SECRET = os.environ.get("SPOTIFY_CLIENT_SECRET", None)
 
 app = Flask(__name__)
 
+# コンパイル済みテンプレートのバイトコードをディスクに保存し、再起動後のコンパイルを省く
+# JINJA_CACHE_DIRを指定しない場合はOSの一時ディレクトリを使う
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(
+    os.environ.get("JINJA_CACHE_DIR") or None
+)
+
 
 # カスタムフィルターを追加
 @app.template_filter("number_format")
@@ -38,40 +80,281 @@ def number_format(value):
     return "{:,}".format(value)
 
 
+# レスポンス圧縮と静的ファイルキャッシュの設定
+COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", 1024))  # 圧縮する最小バイト数
+COMPRESS_LEVEL = int(os.environ.get("COMPRESS_LEVEL", 6))  # gzipの圧縮レベル
+COMPRESS_MIMETYPES = {
+    "text/html",
+    "text/css",
+    "text/plain",
+    "text/xml",
+    "application/json",
+    "application/javascript",
+    "text/javascript",
+    "image/svg+xml",
+}
+STATIC_MAX_AGE = 365 * 24 * 60 * 60  # フィンガープリント付き静的ファイルは1年キャッシュ
+
+
+def accepts_gzip():
+    # クライアントがAccept-Encodingでgzipを受け付けるかを判定
+    return request.accept_encodings.quality("gzip") > 0
+
+
+# 静的ファイルの内容からハッシュ値を計算する (更新時刻が変われば再計算)
+@lru_cache(maxsize=256)
+def static_fingerprint(path, mtime):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+# 静的ファイルのgzip圧縮版を一度だけ作成して保持する
+@lru_cache(maxsize=64)
+def precompressed_static(path, mtime):
+    with open(path, "rb") as f:
+        return gzip.compress(f.read(), compresslevel=9)
+
+
+def static_file_path(filename):
+    # staticフォルダ内の実在するファイルパスを返す。存在しなければNone
+    path = safe_join(app.static_folder, filename)
+    if path is None or not os.path.isfile(path):
+        return None
+    return path
+
+
+# url_for("static", ...) にコンテンツハッシュを付与する
+# 例: /static/styles.css?v=3f2a9c1b7d4e
+@app.url_defaults
+def add_static_fingerprint(endpoint, values):
+    if endpoint != "static" or "v" in values or "filename" not in values:
+        return
+    path = static_file_path(values["filename"])
+    if path:
+        values["v"] = static_fingerprint(path, os.path.getmtime(path))
+
+
+# 静的ファイルの配信
+# フィンガープリントが一致する場合はimmutableな長期キャッシュを指定し、
+# テキスト系ファイルは事前圧縮したgzip版を返す
+def serve_static(filename):
+    path = static_file_path(filename)
+    if path is None:
+        abort(404)
+
+    mtime = os.path.getmtime(path)
+    fingerprint = static_fingerprint(path, mtime)
+    mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    fingerprinted = request.args.get("v") == fingerprint
+
+    if mimetype in COMPRESS_MIMETYPES and accepts_gzip():
+        response = Response(precompressed_static(path, mtime), mimetype=mimetype)
+        response.headers["Content-Encoding"] = "gzip"
+        response.set_etag(f"{fingerprint}-gzip")
+        response.last_modified = mtime
+        response.make_conditional(request)
+    else:
+        response = send_from_directory(
+            app.static_folder,
+            filename,
+            max_age=STATIC_MAX_AGE if fingerprinted else None,
+        )
+
+    if fingerprinted:
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_MAX_AGE
+        response.cache_control.immutable = True
+    if mimetype in COMPRESS_MIMETYPES:
+        response.vary.add("Accept-Encoding")
+    return response
+
+
+app.view_functions["static"] = serve_static
+
+
+# 動的レスポンスのgzip圧縮
+# Accept-Encodingでgzipが許可され、一定サイズ以上のテキスト系レスポンスのみ圧縮する
+@app.after_request
+def compress_response(response):
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or not 200 <= response.status_code < 300
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESS_MIMETYPES
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    if not accepts_gzip():
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    response.set_data(gzip.compress(data, compresslevel=COMPRESS_LEVEL))
+    response.headers["Content-Encoding"] = "gzip"
+
+    # 圧縮後は別表現になるため、強いETagには接尾辞を付ける
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f"{etag}-gzip")
+    return response
+
+
 # グローバル変数とロックを初期化
 spotify_client = None
-client_lock = Lock()
+client_lock = Lock()  # クライアントの作成時だけ使う
+
+# Spotify APIと画像の取得に共有するHTTPセッション
+# 複数のスレッドから同時に使うため、同時接続数に合わせてコネクションプールを大きくする
+# (requestsの既定は10接続で、超えた分の接続は使い捨てになる)
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", 32))
+
+
+def build_http_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_maxsize=HTTP_POOL_SIZE,
+        # spotipyの既定と同じく、429と5xxは待ってから再試行する
+        max_retries=Retry(
+            total=3,
+            connect=None,
+            read=False,
+            allowed_methods=frozenset(["GET", "POST"]),
+            status=3,
+            backoff_factor=0.3,
+            status_forcelist=Spotify.default_retry_codes,
+        ),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
-# playlists変数の初期化
-playlists = None
-playlists_grouped = defaultdict(
-    list
-)  # カテゴリごとにプレイリストを整理する辞書の初期化
 
-# default_playlist_id変数の初期化
-default_playlist_id = None
+http_session = build_http_session()
 
+# --- プレイリストのカタログ (config/playlists.json) ---
+# 形式: {"カテゴリ名": {"プレイリストID": "表示名", ...}, ...}
+# ファイルの更新時刻を定期的に確認し、変更があれば再起動せずに読み込み直す
+PLAYLIST_CATALOG_PATH = os.environ.get("PLAYLIST_CATALOG_PATH", "config/playlists.json")
+PLAYLIST_CATALOG_CHECK_INTERVAL = float(
+    os.environ.get("PLAYLIST_CATALOG_CHECK_INTERVAL", 5)
+)  # 秒
 
-# JSONファイルを読み込む
-try:
-    with open("config/playlists.json", "r", encoding="utf-8") as f:
-        # JSON全体をロード
-        playlists_data = json.load(f)
 
-    # カテゴリごとにプレイリストを整理
-    playlists_grouped = {
-        category: [(id, name) for id, name in playlists.items()]
-        for category, playlists in playlists_data.items()
-    }
+# カタログの形式が不正な場合の例外
+class CatalogError(ValueError):
+    pass
 
-    # 最初のカテゴリの最初のプレイリストIDをデフォルトに設定
-    first_category = next(iter(playlists_grouped.keys()))
-    default_playlist_id = playlists_grouped[first_category][0][0]
 
-except FileNotFoundError:
-    print("playlists.jsonが見つかりません。")
-except json.JSONDecodeError:
-    print("playlists.jsonの形式が不正です。")
+# 読み込み済みのカタログ。差し替えは新しいインスタンスへの参照の置き換えで行い、
+# 作成後は変更しない (リクエスト処理中に内容が変わらない)
+class PlaylistCatalog:
+    def __init__(self, grouped, mtime=None):
+        self.grouped = grouped  # カテゴリ -> [(プレイリストID, 表示名), ...]
+        self.mtime = mtime
+        self.playlist_ids = frozenset(
+            playlist_id for items in grouped.values() for playlist_id, _ in items
+        )
+        # 最初のカテゴリの最初のプレイリストをデフォルトにする
+        self.default_playlist_id = next(
+            (items[0][0] for items in grouped.values() if items), None
+        )
+        # ドロップダウンのカテゴリ部分は毎回同じなので、読み込み時に描画しておく
+        self.options_html = Markup("").join(
+            Markup('<optgroup label="{}">{}</optgroup>').format(
+                category,
+                Markup("").join(
+                    Markup('<option value="{}">{}</option>').format(playlist_id, name)
+                    for playlist_id, name in items
+                ),
+            )
+            for category, items in grouped.items()
+        )
+        # ETagに含める版 (ドロップダウンの内容が変わったらページのキャッシュも無効にする)
+        self.version = hashlib.sha1(
+            json.dumps(list(grouped.items())).encode("utf-8")
+        ).hexdigest()[:12]
+
+
+# JSONの内容を検証し、カテゴリごとのプレイリスト一覧に変換する
+# 不正な場合は、どこが不正かを示すCatalogErrorを送出する
+def parse_playlist_catalog(data):
+    if not isinstance(data, dict) or not data:
+        raise CatalogError("トップレベルはカテゴリ名をキーとするオブジェクトにしてください")
+    grouped = {}
+    for category, playlists in data.items():
+        if not isinstance(playlists, dict) or not playlists:
+            raise CatalogError(
+                f"カテゴリ {category!r} はプレイリストIDと表示名のオブジェクトにしてください"
+            )
+        items = []
+        for playlist_id, name in playlists.items():
+            if not playlist_id.isalnum():
+                raise CatalogError(f"カテゴリ {category!r} のプレイリストID {playlist_id!r} が不正です")
+            if not isinstance(name, str) or not name.strip():
+                raise CatalogError(f"プレイリスト {playlist_id!r} の表示名が不正です")
+            items.append((playlist_id, name))
+        grouped[category] = items
+    return grouped
+
+
+def load_playlist_catalog(path):
+    mtime = os.stat(path).st_mtime
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return PlaylistCatalog(parse_playlist_catalog(data), mtime)
+
+
+playlist_catalog = PlaylistCatalog({})  # 読み込みに失敗した場合は空のカタログ
+catalog_lock = Lock()
+catalog_checked_at = 0.0  # 最後に更新時刻を確認した時刻
+catalog_seen_mtime = None  # 最後に読み込みを試みたファイルの更新時刻
+
+
+# ファイルが変更されていればカタログを読み込み直し、新しいカタログに差し替える
+# 読み込みに失敗した場合は、それまでのカタログを使い続ける
+# 戻り値: 差し替えた場合はTrue
+def reload_playlist_catalog():
+    global playlist_catalog, catalog_seen_mtime
+    with catalog_lock:
+        try:
+            mtime = os.stat(PLAYLIST_CATALOG_PATH).st_mtime
+        except FileNotFoundError:
+            if catalog_seen_mtime != "missing":
+                logging.error(f"{PLAYLIST_CATALOG_PATH}が見つかりません。")
+                catalog_seen_mtime = "missing"
+            return False
+        if mtime == catalog_seen_mtime:
+            return False
+        catalog_seen_mtime = mtime  # 不正なファイルで毎回エラーを記録しないようにする
+        try:
+            catalog = load_playlist_catalog(PLAYLIST_CATALOG_PATH)
+        except (OSError, json.JSONDecodeError, CatalogError) as e:
+            logging.error(f"{PLAYLIST_CATALOG_PATH}の形式が不正です: {e}")
+            return False
+        previous = playlist_catalog
+        playlist_catalog = catalog
+    logging.info(f"プレイリストのカタログを読み込みました ({len(catalog.playlist_ids)}件)")
+    if previous.mtime is not None:
+        # 起動後に追加されたプレイリストは、最初のアクセスに備えて先に取得しておく
+        schedule_playlist_prewarm(sorted(catalog.playlist_ids - previous.playlist_ids))
+    return True
+
+
+# 現在のカタログを返す。一定間隔ごとにファイルの変更を確認する
+def get_playlist_catalog():
+    global catalog_checked_at
+    now = time.monotonic()
+    if now - catalog_checked_at >= PLAYLIST_CATALOG_CHECK_INTERVAL:
+        catalog_checked_at = now
+        reload_playlist_catalog()
+    return playlist_catalog
+
+
+reload_playlist_catalog()
 
 
 # APIキーをチェック
@@ -85,30 +368,392 @@ def check_api_keys():
 # Spotify API Clientを生成して返す。言語設定はしない。
 def get_spotify_client():
     global spotify_client
+    # 作成済みならロックを取らずに返す (作成後にクライアントが置き換わることはない)
+    client = spotify_client
+    if client is not None:
+        return client
     with client_lock:
-        if not spotify_client:
+        if spotify_client is None:
             spotify_client = Spotify(
                 client_credentials_manager=SpotifyClientCredentials(
-                    client_id=SPOTIFY_CLIENT_ID, client_secret=SPOTIFY_CLIENT_SECRET
-                ), language = "ja",
+                    client_id=SPOTIFY_CLIENT_ID,
+                    client_secret=SPOTIFY_CLIENT_SECRET,
+                    requests_session=http_session,
+                ),
+                requests_session=http_session,
+                language="ja",
             )
         return spotify_client
 
 
+# 有効期限付きのLRUキャッシュ (スレッドセーフ)
+# lru_cacheと違い、エントリごとに保存時刻と有効期限を持つ
+class TTLCache:
+    def __init__(self, maxsize=1024, ttl=3600):
+        self.maxsize = maxsize  # 保持する最大エントリ数
+        self.ttl = ttl  # デフォルトの有効期限 (秒)
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (value, stored_at, expires_at)
+        self._lock = Lock()
+
+    def get_entry(self, key):
+        # (値, 保存時刻) を返す。存在しないか期限切れならNone
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[2] <= time.time():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def get(self, key, default=None):
+        entry = self.get_entry(key)
+        return default if entry is None else entry[0]
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        with self._lock:
+            self._data[key] = (value, now, now + (self.ttl if ttl is None else ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return None if entry is None else entry[0]
+
+    def entries(self):
+        # 期限切れでない (キー, 値, 保存時刻, 有効期限) のリスト (古い順)
+        now = time.time()
+        with self._lock:
+            return [
+                (key, value, stored_at, expires_at)
+                for key, (value, stored_at, expires_at) in self._data.items()
+                if expires_at > now
+            ]
+
+    def restore(self, key, value, stored_at, expires_at):
+        # スナップショットのエントリを元の有効期限のまま、最も古いエントリとして戻す
+        # 既存のエントリは上書きせず、満杯なら戻さない (起動後に使われたエントリを追い出さない)
+        # 戻り値: 戻したかどうか
+        if expires_at <= time.time():
+            return False
+        with self._lock:
+            if key in self._data or len(self._data) >= self.maxsize:
+                return False
+            self._data[key] = (value, stored_at, expires_at)
+            self._data.move_to_end(key, last=False)
+            return True
+
+    def __len__(self):
+        return len(self._data)
+
+
+# --- ネガティブキャッシュ ---
+# 存在しない・非公開のID や検索結果のないキーワードを短時間記録し、
+# 同じリクエストが繰り返されてもSpotify APIを呼び出さずにエラーを返す
+NEGATIVE_CACHE_TTL = int(os.environ.get("NEGATIVE_CACHE_TTL", 5 * 60))
+negative_cache = TTLCache(maxsize=4096, ttl=NEGATIVE_CACHE_TTL)
+negative_cache_hits = defaultdict(int)  # 種類ごとの、API呼び出しを省略した回数
+negative_cache_stores = defaultdict(int)  # 種類ごとの、記録した回数
+
+
+# 存在しないことが分かっているエンティティへのアクセス
+class MissingEntityError(Exception):
+    def __init__(self, kind, key):
+        super().__init__(f"{kind} not found: {key}")
+        self.kind = kind
+        self.key = key
+
+
+# 400のうち、IDそのものが不正であることを表すエラーメッセージ
+# (Spotify APIの応答と、spotipyがIDの形式を確認して送出するもの)
+INVALID_ID_MESSAGES = (
+    "invalid id",
+    "invalid base62 id",
+    "unsupported url / uri",
+    "unexpected spotify url",
+    "unexpected spotify uri",
+)
+
+
+# 例外が「IDが存在しない・不正」を表すかどうか
+# 認証エラーやレート制限、サーバーエラー、パラメーター誤りなどの400はネガティブキャッシュしない
+def is_missing_error(e):
+    if isinstance(e, MissingEntityError):
+        return True
+    if isinstance(e, SpotifyException):
+        # spotipyはHTTPエラーもすべて code -1 で送出するため、code ではなくメッセージで判定する
+        status, message = e.http_status, e.msg
+    elif isinstance(e, requests.HTTPError) and e.response is not None:
+        status, message = e.response.status_code, e.response.text
+    else:
+        return "Unsupported URL / URI" in str(e)
+    if status == 404:
+        return True
+    message = (message or "").lower()
+    return status == 400 and any(text in message for text in INVALID_ID_MESSAGES)
+
+
+# kind (種類) と key (IDやキーワード) が存在しないと記録済みかどうか
+# 引数: count (Falseならヒット数に数えない。先読みなどユーザーの要求以外で使う)
+def is_known_missing(kind, key, count=True):
+    if negative_cache.get((kind, key)) is None:
+        return False
+    if count:
+        negative_cache_hits[kind] += 1
+    return True
+
+
+def remember_missing(kind, key):
+    negative_cache.set((kind, key), True)
+    negative_cache_stores[kind] += 1
+
+
+# 存在しないと記録済みならAPIを呼ばずにMissingEntityErrorを送出し、
+# そうでなければfetchを呼び出す。IDが存在しないエラーになった場合は記録する
+# 引数: count (is_known_missingと同じ)
+def fetch_unless_missing(kind, key, fetch, count=True):
+    if is_known_missing(kind, key, count):
+        raise MissingEntityError(kind, key)
+    try:
+        return fetch()
+    except Exception as e:
+        if is_missing_error(e):
+            remember_missing(kind, key)
+        raise
+
+
+# ページのHTTPキャッシュ設定
+# max-ageはブラウザ、s-maxageはCDNなどの共有キャッシュ向け
+PAGE_MAX_AGE = int(os.environ.get("PAGE_MAX_AGE", 60))
+PAGE_S_MAXAGE = int(os.environ.get("PAGE_S_MAXAGE", 600))
+
+
+# テンプレートの内容からバージョンを計算する
+# デプロイでテンプレートが変われば、データが同じでもETagが変わる
+def compute_template_version():
+    digest = hashlib.sha1()
+    for root, _, files in sorted(os.walk(app.template_folder)):
+        for name in sorted(files):
+            with open(os.path.join(root, name), "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+TEMPLATE_VERSION = compute_template_version()
+
+# エンティティごとのデータバージョンと、そのバージョンを最初に確認した時刻
+entity_versions = TTLCache(maxsize=8192, ttl=30 * 24 * 60 * 60)
+
+
+# エンティティのデータバージョンを取得する
+# 引数: kind (種類), entity_id (ID),
+#       data (snapshot_idなどのバージョン文字列、またはハッシュ化するデータ)
+# 戻り値: (バージョン, 最終更新時刻) のタプル
+def entity_version(kind, entity_id, data):
+    if isinstance(data, str):
+        version = data
+    else:
+        version = hashlib.sha1(
+            json.dumps(data, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+    key = (kind, entity_id)
+    entry = entity_versions.get(key)
+    if entry is None or entry[0] != version:
+        entry = (version, time.time())
+        entity_versions.set(key, entry)
+    return entry
+
+
+# データバージョンとクエリ文字列から強いETagを作成
+def make_etag(*parts):
+    raw = "|".join(str(part) for part in (TEMPLATE_VERSION,) + parts)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20]
+
+
+# レスポンスにETag、Last-Modified、Cache-Controlを設定する
+def set_cache_headers(response, etag, last_modified=None):
+    # 逐次圧縮するストリーミングレスポンスは、圧縮版のETagにする
+    if response.headers.get("Content-Encoding") == "gzip":
+        etag = f"{etag}-gzip"
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = PAGE_MAX_AGE
+    if PAGE_S_MAXAGE:
+        response.cache_control.s_maxage = PAGE_S_MAXAGE
+    return response
+
+
+# 条件付きGETの判定
+# If-None-Match (なければIf-Modified-Since) が一致すれば304レスポンスを返す。
+# 一致しなければNoneを返すので、呼び出し側でテンプレートを描画する
+def conditional_response(etag, last_modified=None):
+    if request.if_none_match:
+        matched = request.if_none_match.contains(
+            etag
+        ) or request.if_none_match.contains(f"{etag}-gzip")
+    elif last_modified and request.if_modified_since:
+        matched = int(last_modified) <= request.if_modified_since.timestamp()
+    else:
+        matched = False
+
+    if not matched:
+        return None
+    response = set_cache_headers(Response(status=304), etag, last_modified)
+    if request.if_none_match.contains(f"{etag}-gzip"):
+        response.set_etag(f"{etag}-gzip")  # クライアントが持つ圧縮版のETagを返す
+    return response
+
+
+# テンプレートの描画結果にキャッシュ用ヘッダーを付けて返す
+def cacheable_response(body, etag, last_modified=None):
+    return set_cache_headers(make_response(body), etag, last_modified)
+
+
+# ストリーミング出力の設定
+STREAM_BUFFER_SIZE = 16 * 1024  # この文字数がたまったら送信する
+
+
+# テンプレートのストリーミング出力をまとめて送信するジェネレーター
+# 細かい出力はバッファにため、空の出力が来たらフラッシュの合図として送信する
+# gzip_output=Trueの場合は、フラッシュごとに区切りながら逐次gzip圧縮する
+def buffered_stream(pieces, gzip_output=False):
+    compressor = (
+        zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        if gzip_output
+        else None
+    )
+    buffer = []
+    size = 0
+    for piece in pieces:
+        if piece:
+            buffer.append(piece)
+            size += len(piece)
+        if buffer and (not piece or size >= STREAM_BUFFER_SIZE):
+            data = "".join(buffer).encode("utf-8")
+            buffer = []
+            size = 0
+            if compressor:
+                data = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            yield data
+
+    data = "".join(buffer).encode("utf-8")
+    if compressor:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+
+# テンプレートをストリーミングで描画するレスポンスを返す
+# 先頭部分は描画でき次第送信し、残りはデータの取得に合わせて順に送信する
+def stream_page(template_name, **context):
+    gzip_output = accepts_gzip()
+    response = Response(
+        buffered_stream(stream_template(template_name, **context), gzip_output),
+        mimetype="text/html",
+    )
+    response.vary.add("Accept-Encoding")
+    if gzip_output:
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+# 楽曲詳細ページ用のトラック情報とオーディオ特性のキャッシュ
+# トラック一覧の取得時に、既に取得したデータで事前に埋めておく
+track_cache = TTLCache(maxsize=4096, ttl=60 * 60)
+audio_features_cache = TTLCache(maxsize=8192, ttl=24 * 60 * 60)  # 特性値はほぼ変わらない
+
+
+# 楽曲詳細ページが使う項目だけをトラック辞書から取り出す
+def compact_track(track):
+    album = track["album"]
+    return {
+        "id": track["id"],
+        "name": track["name"],
+        "duration_ms": track["duration_ms"],
+        "popularity": track["popularity"],
+        "artists": [
+            {"name": artist["name"], "id": artist["id"]} for artist in track["artists"]
+        ],
+        "album": {
+            "id": album["id"],
+            "name": album["name"],
+            "release_date": album["release_date"],
+            "images": album["images"],
+        },
+    }
+
+
+# オーディオ特性のうちアプリで使う項目 (URLなどは保持しない)
+AUDIO_FEATURE_FIELDS = (
+    "id",
+    "acousticness",
+    "danceability",
+    "energy",
+    "instrumentalness",
+    "key",
+    "liveness",
+    "loudness",
+    "mode",
+    "speechiness",
+    "tempo",
+    "time_signature",
+    "valence",
+)
+
+
+def compact_audio_features(feature):
+    return {field: feature.get(field) for field in AUDIO_FEATURE_FIELDS}
+
+
+# 完全なトラック辞書 (popularityなどを含む) であればキャッシュに保存する
+# アルバムの収録曲のような簡易版のトラック辞書は保存しない
+def seed_track_cache(track):
+    if "popularity" not in track or "duration_ms" not in track:
+        return
+    try:
+        track_cache.set(track["id"], compact_track(track))
+    except KeyError:
+        pass
+
+
 # トラックのIDリストからオーディオ特性をバッチで取得する関数
 # 引数: track_ids (Spotify APIから取得したトラックIDのリスト)
 # 戻り値: トラックIDをキーとし、各トラックのオーディオ特性データを含む辞書
 def get_tracks_audio_features(track_ids):
-    sp = get_spotify_client()  # Spotifyクライアントを取得
     features_dict = {}
+    missing_ids = []
+    for track_id in track_ids:
+        feature = audio_features_cache.get(track_id)
+        if feature is None:
+            missing_ids.append(track_id)
+        else:
+            features_dict[track_id] = feature
+    if not missing_ids:
+        return features_dict
+
+    sp = get_spotify_client()  # Spotifyクライアントを取得
 
     # トラックIDのリストを50曲ずつのバッチに分割し、各バッチごとにオーディオ特性を取得
-    for i in range(0, len(track_ids), 50):
-        batch = track_ids[i:i + 50]
+    for i in range(0, len(missing_ids), 50):
+        batch = missing_ids[i:i + 50]
         features_list = sp.audio_features(batch)  # オーディオ特性を取得
         for feature in features_list:
             if feature:
+                feature = compact_audio_features(feature)
                 features_dict[feature["id"]] = feature  # 特性を辞書に追加
+                audio_features_cache.set(feature["id"], feature)
     return features_dict
 
 
@@ -144,105 +789,411 @@ camelot_colors = {
 }
 
 
+# --- キーとキャメロットの変換テーブル ---
+# Spotifyのkeyはピッチクラス (0=C, 1=C#/Db, ..., 11=B)、modeは調 (0=短調, 1=長調)
+# 以下のテーブルは key * 2 + mode の位置に値を持つ
+PITCH_CLASS_NAMES = (
+    "C", "C#/Db", "D", "D#/Eb", "E", "F", "F#/Gb", "G", "G#/Ab", "A", "A#/Bb", "B",
+)
+# キャメロット・ホイールに基づくキー (短調, 長調 の順にピッチクラスごとに並べる)
+CAMELOT_CODES = (
+    "5A", "8B",  # C
+    "12A", "3B",  # C#/Db
+    "7A", "10B",  # D
+    "2A", "5B",  # D#/Eb
+    "9A", "12B",  # E
+    "4A", "7B",  # F
+    "11A", "2B",  # F#/Gb
+    "6A", "9B",  # G
+    "1A", "4B",  # G#/Ab
+    "8A", "11B",  # A
+    "3A", "6B",  # A#/Bb
+    "10A", "1B",  # B
+)
+KEY_SIGNATURES = tuple(
+    f"{PITCH_CLASS_NAMES[index // 2]} {'Maj' if index % 2 else 'min'}"
+    for index in range(24)
+)
+CAMELOT_KEY_COLORS = tuple(camelot_colors[code] for code in CAMELOT_CODES)
+# 並べ替え用の番号 (1A=2, 1B=3, ..., 12B=25)。キャメロット表記から引く
+CAMELOT_SORT_CODES = {
+    code: int(code[:-1]) * 2 + (code[-1] == "B") for code in CAMELOT_CODES
+}
+UNKNOWN_CAMELOT_COLOR = "#FFFFFF"
+
+
+# テーブルの位置 (key * 2 + mode) を返す。キーが検出されていない (-1) 場合などはNone
+def key_table_index(key, mode):
+    if type(key) is int and 0 <= key < 12 and (mode == 0 or mode == 1):
+        return key * 2 + mode
+    return None
+
+
 def camelot_key(key, mode):
-    # キャメロット・ホイールに基づくキーの変換テーブル
-    camelot_map = {
-        # Major keys
-        (0, 1): "8B",
-        (1, 1): "3B",
-        (2, 1): "10B",
-        (3, 1): "5B",
-        (4, 1): "12B",
-        (5, 1): "7B",
-        (6, 1): "2B",
-        (7, 1): "9B",
-        (8, 1): "4B",
-        (9, 1): "11B",
-        (10, 1): "6B",
-        (11, 1): "1B",
-        # Minor keys
-        (0, 0): "5A",
-        (1, 0): "12A",
-        (2, 0): "7A",
-        (3, 0): "2A",
-        (4, 0): "9A",
-        (5, 0): "4A",
-        (6, 0): "11A",
-        (7, 0): "6A",
-        (8, 0): "1A",
-        (9, 0): "8A",
-        (10, 0): "3A",
-        (11, 0): "10A",
-    }
+    index = key_table_index(key, mode)
+    return "N/A" if index is None else CAMELOT_CODES[index]
 
-    # キーと調を数値で取得し、対応するキャメロット・キーを返す
-    return camelot_map.get((key, mode), "N/A")
 
+# 表示サイズごとに必要な画像幅 (px)。高DPI端末を考慮して表示幅の2倍を目安にする
+ARTWORK_WIDTHS = {
+    "thumbnail": 160,  # トラック一覧のサムネイル (最大80px表示)
+    "cover": 400,  # アルバム一覧のカバー画像 (最大200px表示)
+    "detail": 640,  # 詳細ページやプレイヤーの大きな画像
+}
 
-def get_track_info(track, audio_features):
-    try:
-        image_url = (
-            track["album"]["images"][0]["url"]
-            if track["album"]["images"]
-            else url_for("static", filename="tunenest.jpg", _external=True)
-        )
+# トラック一覧のサムネイルの表示幅 (styles.cssのブレークポイントに合わせる)
+THUMBNAIL_SIZES = "(max-width: 480px) 40px, (max-width: 768px) 60px, 80px"
+app.add_template_global(THUMBNAIL_SIZES, "thumbnail_sizes")
+
+
+# Spotifyの画像リストから、表示サイズを満たす最小の画像URLを選ぶ
+# 引数: images (Spotify APIの画像リスト), size (ARTWORK_WIDTHSのキー)
+# 戻り値: 画像URL。画像がなければNone
+@app.template_filter("artwork")
+def select_artwork(images, size):
+    if not images:
+        return None
+    min_width = ARTWORK_WIDTHS[size]
+    # 幅が不明な画像は最大とみなす (Spotifyは大きい順に返す)
+    by_width = sorted(images, key=lambda image: image.get("width") or float("inf"))
+    for image in by_width:
+        if (image.get("width") or float("inf")) >= min_width:
+            return image["url"]
+    return by_width[-1]["url"]
+
+
+# Spotifyの画像リストからsrcset属性の値を作成する
+# 例: "https://i.scdn.co/image/xxx 64w, https://i.scdn.co/image/yyy 300w"
+@app.template_filter("srcset")
+def artwork_srcset(images):
+    return ", ".join(
+        f"{image['url']} {image['width']}w"
+        for image in sorted(images or [], key=lambda image: image.get("width") or 0)
+        if image.get("width")
+    )
 
-        spotify_link = track["external_urls"]["spotify"]
-        artist_name = track["artists"][0]["name"]
-        artist_id = track["artists"][0]["id"]  # アーティストIDを取得
-        tempo = audio_features["tempo"] if audio_features else "不明"
-
-        # キーと調を解析
-        key_map = [
-            "C",
-            "C#/Db",
-            "D",
-            "D#/Eb",
-            "E",
-            "F",
-            "F#/Gb",
-            "G",
-            "G#/Ab",
-            "A",
-            "A#/Bb",
-            "B",
-        ]
-        key = (
-            key_map[audio_features["key"]]
-            if audio_features and "key" in audio_features
-            else "N/A"
-        )
-        mode = "Maj" if audio_features and audio_features.get("mode") == 1 else "min"
 
-        # キーと調を組み合わせて文字列を作成
-        key_signature = f"{key} {mode}"
+# 画像プロキシの設定
+# IMAGE_PROXY_DIRを設定すると、サムネイルをローカルにキャッシュして配信する
+IMAGE_PROXY_DIR = os.environ.get("IMAGE_PROXY_DIR")
+IMAGE_PROXY_MAX_BYTES = int(os.environ.get("IMAGE_PROXY_MAX_BYTES", 256 * 1024 * 1024))
+IMAGE_PROXY_MAX_WIDTH = 300  # これより大きい画像はプロキシせず直接配信する
+# 1枚あたりの取得上限 (300px以下のJPEGは通常これより十分小さい)
+IMAGE_PROXY_MAX_IMAGE_BYTES = 256 * 1024
+SPOTIFY_IMAGE_PREFIX = "https://i.scdn.co/image/"
+
+
+# サイズ上限付きのディスクLRUキャッシュ
+# ファイルの更新時刻を最終アクセス時刻として扱い、上限を超えたら古いものから削除する
+# 複数のワーカープロセスが同じディレクトリを共有するため、合計サイズはディレクトリ内の
+# ファイル (.usage) にファイルロック (.lock) を取得して記録し、上限を超えたときだけ
+# ディレクトリを調べ直して削除する
+class DiskLRUCache:
+    STALE_TMP_AGE = 10 * 60  # これより古い一時ファイルは書き込み途中で終了したものとみなす
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._usage_path = os.path.join(directory, ".usage")
+        self._lock_path = os.path.join(directory, ".lock")
+        self._lock = Lock()  # 同じプロセス内のスレッド間の排他
+
+        os.makedirs(directory, exist_ok=True)
+        with self._locked():
+            self._write_usage(self._evict(self._scan()))
+
+    @contextmanager
+    def _locked(self):
+        # プロセス内のロックと、プロセス間のファイルロックを取得する
+        with self._lock, open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_usage(self):
+        try:
+            with open(self._usage_path) as f:
+                return int(f.read() or 0)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_usage(self, usage):
+        with open(self._usage_path, "w") as f:
+            f.write(str(usage))
+
+    def _scan(self):
+        # ロックを取得した状態で呼び出す
+        # キャッシュのファイルを古い順に (名前, サイズ) で返し、残った一時ファイルを削除する
+        now = time.time()
+        existing = []
+        for entry in os.scandir(self.directory):
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.endswith(".tmp"):
+                if now - stat.st_mtime > self.STALE_TMP_AGE:
+                    self._remove(entry.name)  # 書き込み途中で終了したファイル
+                continue
+            if entry.name.startswith("."):
+                continue  # .usage と .lock
+            existing.append((stat.st_mtime, entry.name, stat.st_size))
+        existing.sort()
+        return [(name, size) for _, name, size in existing]
+
+    def _evict(self, entries):
+        # ロックを取得した状態で呼び出す。古いものから削除し、残りの合計サイズを返す
+        total = sum(size for _, size in entries)
+        for name, size in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            self._remove(name)
+            total -= size
+        return total
+
+    def _remove(self, name):
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+
+    def get(self, name):
+        # キャッシュ済みならファイルパスを返し、最終アクセス時刻を更新する
+        # (他のプロセスが書き込んだファイルも使えるよう、ディスクを直接確認する)
+        path = os.path.join(self.directory, name)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, name, data):
+        path = os.path.join(self.directory, name)
+        # 同じ画像を複数のスレッドやプロセスが同時に書き込んでも衝突しない一時ファイル名にする
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f".{name}.", suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+
+        with self._locked():
+            try:
+                replaced = os.path.getsize(path)
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(tmp_path, path)  # 書き込み途中のファイルを配信しないよう置き換える
+            usage = self._read_usage()
+            if usage is None:
+                usage = self.max_bytes + 1  # 記録がなければ調べ直す
+            usage += len(data) - replaced
+            if usage > self.max_bytes:
+                usage = self._evict(self._scan())
+            self._write_usage(usage)
+        return path
+
+
+image_proxy_cache = (
+    DiskLRUCache(IMAGE_PROXY_DIR, IMAGE_PROXY_MAX_BYTES) if IMAGE_PROXY_DIR else None
+)
+
 
-        # キャメロットキーの追加
-        camelot_key_signature = camelot_key(
-            audio_features["key"], audio_features["mode"]
+# 画像URLをローカルの画像プロキシ経由のURLに書き換えるフィルター
+# プロキシが無効、またはSpotify以外の画像の場合はそのまま返す
+@app.template_filter("proxied_artwork")
+def proxied_artwork(url):
+    if image_proxy_cache is None or not url or not url.startswith(SPOTIFY_IMAGE_PREFIX):
+        return url
+    return url_for("artwork_proxy", image_id=url[len(SPOTIFY_IMAGE_PREFIX):])
+
+
+# srcset内の小さい画像のURLをプロキシ経由に書き換えるフィルター
+@app.template_filter("proxied_srcset")
+def proxied_srcset(srcset):
+    if image_proxy_cache is None or not srcset:
+        return srcset
+    candidates = []
+    for candidate in srcset.split(", "):
+        url, width = candidate.rsplit(" ", 1)
+        if int(width[:-1]) <= IMAGE_PROXY_MAX_WIDTH:
+            url = proxied_artwork(url)
+        candidates.append(f"{url} {width}")
+    return ", ".join(candidates)
+
+
+# 画像のないトラックに使うデフォルト画像のURL (リクエストごとに1回だけ生成する)
+def default_artwork_url():
+    url = g.get("default_artwork_url")
+    if url is None:
+        url = g.default_artwork_url = url_for(
+            "static", filename="tunenest.jpg", _external=True
         )
-        camelot_color = camelot_colors.get(camelot_key_signature, "#FFFFFF")
+    return url
+
+
+# Spotify APIのトラック辞書から、表示に必要な項目だけを取り出す
+# 引数: track (Spotify APIから取得したトラックの辞書),
+#       fallback_image_url (画像がない場合のURL。省略時はデフォルト画像)
+# 戻り値: トラック情報の辞書。不良データの場合はNone
+def shape_track(track, fallback_image_url=None):
+    try:
+        album = track["album"]
+        album_images = album["images"]
+        artists = track["artists"]
+        if album_images:
+            image_url = select_artwork(album_images, "detail")
+            thumbnail_url = select_artwork(album_images, "thumbnail") or image_url
+        else:
+            image_url = thumbnail_url = fallback_image_url or default_artwork_url()
 
         # トラック情報を辞書でまとめる
-        track_info = {
+        return {
             "id": track["id"],
             "url": track["preview_url"],
             "name": track["name"],
-            "artist": artist_name,
-            "artist_id": artist_id,  # アーティストIDを追加
-            "image_url": image_url,
-            "spotify_link": spotify_link,
-            "tempo": tempo,
-            "key_signature": key_signature,  # 追加されたキー情報
-            "camelot_key_signature": camelot_key_signature,  # キャメロットキー
-            "camelot_color": camelot_color,  # キャメロットのカラーコード
+            "artist": artists[0]["name"],
+            "artist_id": artists[0]["id"],  # アーティストIDを追加
+            "image_url": image_url,  # プレイヤー表示用の大きな画像
+            "thumbnail_url": thumbnail_url,
+            "image_srcset": artwork_srcset(album_images),  # サムネイル用のsrcset
+            "spotify_link": track["external_urls"]["spotify"],
+            # トラックのpopularityスコアを取得 (万が一ない場合は0)
+            "popularity": track.get("popularity", 0),
+            # エクスポート用の項目
+            "artist_names": ",".join(artist["name"] for artist in artists),
+            "album_name": album.get("name", ""),
+            "release_date": album.get("release_date", ""),
+            "duration_ms": track.get("duration_ms"),
+            "explicit": track.get("explicit", False),
+            "album_id": album.get("id"),  # レーベルはエクスポート時にアルバムから取得する
+            "added_by": track.get("added_by"),  # プレイリストの場合のみ
+            "added_at": track.get("added_at"),  # プレイリストの場合のみ
         }
-        return track_info
-    except KeyError as e:
+    except (KeyError, IndexError) as e:
         logging.warning(f"不良データを検出: {e}")
         return None  # 不良データを無視
 
 
+# 1ページ分のトラック辞書をまとめて整形する (デフォルト画像のURLはページごとに1回だけ求める)
+# 戻り値: トラック情報のリスト (不良データとIDのないトラックは除く)
+def shape_tracks(tracks):
+    fallback_image_url = default_artwork_url()
+    shaped = []
+    for track in tracks:
+        if track and track.get("id"):
+            track_info = shape_track(track, fallback_image_url)
+            if track_info is not None:
+                shaped.append(track_info)
+    return shaped
+
+
+# 1ページ分のトラック情報にオーディオ特性 (テンポ、キー、キャメロット) をまとめて追加する
+# 変換は key * 2 + mode で引くテーブルで行う
+# 引数: shaped (shape_tracksの戻り値), features_by_id (トラックID -> オーディオ特性)
+# 戻り値: オーディオ特性を追加したトラック情報のリスト (特性がないトラックは除く)
+def apply_audio_features_page(shaped, features_by_id):
+    rows = []
+    for track_info in shaped:
+        audio_features = features_by_id.get(track_info["id"])
+        if not audio_features:
+            continue
+        tempo = audio_features.get("tempo")
+        if tempo is None:
+            logging.warning(f"不良データを検出: tempoがありません ({track_info['id']})")
+            continue
+        index = key_table_index(audio_features.get("key"), audio_features.get("mode"))
+        track_info["tempo"] = tempo
+        if index is None:
+            track_info["key_signature"] = "N/A"
+            track_info["camelot_key_signature"] = "N/A"
+            track_info["camelot_color"] = UNKNOWN_CAMELOT_COLOR
+        else:
+            track_info["key_signature"] = KEY_SIGNATURES[index]  # キーと調
+            track_info["camelot_key_signature"] = CAMELOT_CODES[index]  # キャメロットキー
+            track_info["camelot_color"] = CAMELOT_KEY_COLORS[index]  # キャメロットのカラーコード
+        rows.append(track_info)
+    return rows
+
+
+# 1曲分のトラック情報にオーディオ特性を追加する
+# 戻り値: 同じトラック情報の辞書。オーディオ特性が不良の場合はNone
+def apply_audio_features(track_info, audio_features):
+    rows = apply_audio_features_page([track_info], {track_info["id"]: audio_features})
+    return rows[0] if rows else None
+
+
+# JPEG画像の幅をヘッダー (SOFマーカー) から読み取る。読み取れない場合はNone
+def jpeg_width(data):
+    if data[:2] != b"\xff\xd8":
+        return None
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        length = int.from_bytes(data[pos + 2:pos + 4], "big")
+        # SOF0〜SOF15 (DHT, JPG, DACを除く) に画像の高さと幅が入っている
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            if pos + 9 > len(data):
+                return None
+            return int.from_bytes(data[pos + 7:pos + 9], "big")
+        pos += 2 + length
+    return None
+
+
+# プロキシ対象の画像を取得する。大きすぎる画像やJPEG以外の場合はNone
+def fetch_proxy_image(origin_url):
+    data = bytearray()
+    with http_session.get(origin_url, timeout=10, stream=True) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(64 * 1024):
+            data.extend(chunk)
+            if len(data) > IMAGE_PROXY_MAX_IMAGE_BYTES:
+                return None
+    width = jpeg_width(data)
+    if width is None or width > IMAGE_PROXY_MAX_WIDTH:
+        return None
+    return bytes(data)
+
+
+def image_response(source):
+    # Spotifyの画像IDは内容ごとに固有なので、長期キャッシュしてよい
+    response = send_file(source, mimetype="image/jpeg", max_age=STATIC_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+# 画像プロキシのルート
+# Spotifyの画像IDを受け取り、ディスクキャッシュから配信する (なければ取得して保存)
+# IMAGE_PROXY_MAX_WIDTHより大きい画像は保存せず、元のURLにリダイレクトする
+@app.route("/artwork/<image_id>")
+def artwork_proxy(image_id):
+    origin_url = SPOTIFY_IMAGE_PREFIX + image_id
+    if not image_id.isalnum():
+        abort(404)
+    if image_proxy_cache is None:
+        return redirect(origin_url)
+
+    path = image_proxy_cache.get(image_id)
+    if path is not None:
+        try:
+            return image_response(path)
+        except FileNotFoundError:
+            pass  # 確認後に削除された場合は取得し直す
+
+    try:
+        data = fetch_proxy_image(origin_url)
+    except requests.RequestException as e:
+        logging.warning(f"画像の取得に失敗しました: {e}")
+        return redirect(origin_url)
+    if data is None:
+        return redirect(origin_url)
+    image_proxy_cache.put(image_id, data)
+    return image_response(io.BytesIO(data))
+
+
 # robots.txtファイルを返すルート。
 # Flaskのstaticフォルダからファイルを送信します。
 @app.route("/robots.txt")
@@ -250,289 +1201,852 @@ def static_from_root():
     return send_from_directory(app.static_folder, "robots.txt")
 
 
+# プレイリストから取得する最大曲数
+MAX_TRACKS = 500
+# 最初の画面に表示するトラック数と、APIで一度に返す最大トラック数
+FIRST_SCREEN_TRACKS = 50
+MAX_PAGE_SIZE = 100
+
+# 整形済みトラックリストのキャッシュ (プレイリスト・検索結果・アルバムごと)
+hydrated_tracks = TTLCache(maxsize=64, ttl=10 * 60)
+
+# Spotify APIから取得する項目 (fieldsパラメーターで指定できるエンドポイントのみ)
+# shape_trackが読む項目だけを取得し、available_marketsやアルバムの詳細などは転送させない
+# 楽曲詳細ページ用のキャッシュ (compact_track) に必要な項目も含める
+TRACK_FIELDS = (
+    "id,name,preview_url,popularity,duration_ms,explicit,external_urls.spotify,"
+    "artists(id,name),album(id,name,release_date,images)"
+)
+# プレイリストの詳細 (先頭100曲のトラックは取得しない)
+PLAYLIST_FIELDS = "name,description,snapshot_id,external_urls.spotify,followers.total,images,tracks.total"
+# プレイリストのトラックのページ
+PLAYLIST_TRACKS_FIELDS = f"items(added_at,added_by.id,track({TRACK_FIELDS}))"
+
+
+# 整形済みトラックを必要になった分だけ取り出して保持するリスト
+# 最初の画面に必要な分だけSpotifyから取得し、残りは後続のリクエストで取得する
+class LazyTrackList:
+    def __init__(self, rows, meta, version=""):
+        self.meta = meta  # プレイリスト名などの表示用情報
+        self.version = version  # プレイリストのsnapshot_idなど
+        self.complete = False  # 全トラックを取得済みかどうか
+        self.failed = False  # 取得中にエラーが発生したかどうか
+        self._rows = []
+        self._source = rows  # 整形済みトラックを返すイテレーター
+        self._lock = Lock()
+
+    def ensure(self, count=None):
+        # 先頭からcount件 (Noneなら全件) を取得済みにする
+        with self._lock:
+            try:
+                while not self.complete and (count is None or len(self._rows) < count):
+                    try:
+                        self._rows.append(next(self._source))
+                    except StopIteration:
+                        self.complete = True
+                        self._source = None
+            except Exception:
+                self.failed = True
+                raise
+
+    # 取得済みのトラックから、全件取得済みのリストを作成する (スナップショットからの復元用)
+    @classmethod
+    def from_rows(cls, rows, meta, version=""):
+        tracks = cls(iter(()), meta, version)
+        tracks._rows = rows
+        tracks.complete = True
+        tracks._source = None
+        return tracks
+
+    def slice(self, start, stop):
+        self.ensure(stop)
+        return self._rows[start:stop]
+
+    def all(self):
+        self.ensure()
+        return list(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+
+# --- トラック取得のパイプライン ---
+# 「ページ取得 → 必要な項目の取り出し → オーディオ特性の結合」を1ページずつ進める。
+# 各段階は必要な項目を取り出した時点で元のAPIレスポンスを手放すため、
+# 同時に保持する生データは常に1ページ分だけになる
+
+
+# 段階1: プレイリストのトラックを100曲ずつ取得し、トラック辞書のリストを返す
+# 引数: max_tracks (取得する最大曲数。省略時はMAX_TRACKS), start (取得を始める位置)
+def iter_playlist_pages(sp, playlist_id, max_tracks=None, start=0):
+    max_tracks = MAX_TRACKS if max_tracks is None else max_tracks
+    offset = start
+    limit = 100  # 1回のAPI呼び出しで取得できる最大トラック数
+    while offset < max_tracks:
+        results = sp.playlist_tracks(
+            playlist_id,
+            fields=PLAYLIST_TRACKS_FIELDS,
+            offset=offset,
+            limit=limit,
+            market="JP",
+        )
+        if results is None or results["items"] is None:
+            raise ValueError("Spotify APIが正常な値を返しませんでした。")
+
+        # 全てのトラックを取得したかどうか
+        is_last_page = len(results["items"]) < limit
+        page = []
+        for item in results["items"][: max_tracks - offset]:
+            track = item.get("track")
+            if track:
+                # 追加日時と追加したユーザーはトラック辞書に移す
+                track["added_at"] = item.get("added_at")
+                track["added_by"] = (item.get("added_by") or {}).get("id")
+            page.append(track)
+        del results  # プレイリスト項目の残りは使わないので手放す
+        yield page
+
+        if is_last_page:
+            break
+        offset += limit
+
+
+# 段階1: キーワード検索の結果を最大100曲まで、50曲ずつ返す
+def iter_search_pages(sp, keyword, first_results):
+    total_results = first_results["tracks"]["total"]
+    yield first_results["tracks"]["items"]
+
+    # 検索結果が50件を超える場合、次の50件を追加で取得
+    if total_results > 50:
+        additional_results = sp.search(
+            q=keyword, type="track", limit=50, offset=50, market="JP"
+        )
+        yield additional_results["tracks"]["items"]
+
+
+# 段階1: アルバムの収録曲をページ単位で返す
+def iter_album_pages(sp, album, first_page):
+    page = first_page
+    offset = 0
+    while True:
+        items = page["items"]
+        total = page["total"]
+        # アルバムのアートワークを各楽曲のアートワークとして設定
+        for track in items:
+            track["album"] = album
+        yield items
+
+        offset += len(items)
+        if not items or offset >= total:
+            break
+        page = sp.album_tracks(album["id"], offset=offset, market="JP")
+
+
+# 段階2: トラック辞書のリストから表示に必要な項目だけを取り出す
+# 楽曲詳細ページ用のキャッシュもここで埋める
+# 受け取ったリストは取り出し後に空にし、生のトラック辞書を手放す
+# 引数: seed_cache (Falseなら楽曲詳細ページ用のキャッシュを埋めない)
+def shape_track_pages(pages, seed_cache=True):
+    for page in pages:
+        for track in page:
+            if seed_cache and track and track.get("id"):
+                seed_track_cache(track)
+        shaped = shape_tracks(page)
+        page.clear()
+        yield shaped
+
+
+# アーティストのジャンルのキャッシュ (ジャンルはほとんど変わらないため長めに保持する)
+artist_genre_cache = TTLCache(maxsize=16384, ttl=7 * 24 * 60 * 60)
+
+
+# 複数アーティストのジャンルをキャッシュ経由で取得する (未取得分は50件ずつまとめて取得)
+# 戻り値: アーティストID -> ジャンルのリスト
+def get_artist_genres(sp, artist_ids):
+    genres = {}
+    missing_ids = []
+    for artist_id in dict.fromkeys(artist_ids):
+        cached = artist_genre_cache.get(artist_id)
+        if cached is not None:
+            genres[artist_id] = cached
+        elif not is_known_missing("artist", artist_id, count=False):
+            missing_ids.append(artist_id)
+
+    for i in range(0, len(missing_ids), 50):
+        batch = missing_ids[i:i + 50]
+        for artist_id, artist in zip(batch, sp.artists(batch)["artists"]):
+            if not artist:
+                remember_missing("artist", artist_id)
+                continue
+            # アーティストページ用のキャッシュも同時に埋める
+            artist_cache.set(artist_id, artist_summary(artist))
+            genres[artist_id] = artist_cache_genres(artist)
+    return genres
+
+
+# アーティスト辞書のジャンルをジャンルのキャッシュに保存して返す
+def artist_cache_genres(artist):
+    genres = artist.get("genres") or []
+    artist_genre_cache.set(artist["id"], genres)
+    return genres
+
+
+# アルバムのレーベルのキャッシュ (トラックのアルバム情報には含まれないため、アルバムを一括取得する)
+album_label_cache = TTLCache(maxsize=16384, ttl=7 * 24 * 60 * 60)
+
+
+# アルバム辞書のレーベルをレーベルのキャッシュに保存して返す
+def album_cache_label(album):
+    label = album.get("label") or ""
+    album_label_cache.set(album["id"], label)
+    return label
+
+
+# 複数アルバムのレーベルをキャッシュ経由で取得する (未取得分は20件ずつまとめて取得)
+# 戻り値: アルバムID -> レーベル名
+def get_album_labels(sp, album_ids):
+    labels = {}
+    missing_ids = []
+    for album_id in dict.fromkeys(album_ids):
+        if not album_id:
+            continue
+        cached = album_label_cache.get(album_id)
+        if cached is not None:
+            labels[album_id] = cached
+        elif not is_known_missing("album", album_id, count=False):
+            missing_ids.append(album_id)
+
+    for i in range(0, len(missing_ids), 20):
+        batch = missing_ids[i:i + 20]
+        for album_id, album in zip(batch, sp.albums(batch, market="JP")["albums"]):
+            if not album:
+                remember_missing("album", album_id)
+                continue
+            labels[album_id] = album_cache_label(album)
+    return labels
+
+
+# 段階2.5: 1ページ分のトラックに、アーティストのジャンルを付ける
+def attach_artist_genres(sp, shaped_pages):
+    for shaped in shaped_pages:
+        try:
+            genres = get_artist_genres(sp, [track_info["artist_id"] for track_info in shaped])
+        except Exception as e:
+            # ジャンルは補助的な情報のため、取得できなくても一覧の表示は続ける
+            logging.warning(f"アーティストのジャンルを取得できませんでした: {e}")
+            genres = {}
+        for track_info in shaped:
+            track_info["genres"] = genres.get(track_info["artist_id"], [])
+        yield shaped
+
+
+# 段階3: 1ページ分のトラックにオーディオ特性を結合し、1曲ずつ返す
+# オーディオ特性のないトラックは除外し、popularityが0のトラックは再取得する
+def merge_audio_features(sp, shaped_pages, seed_cache=True):
+    for shaped in shaped_pages:
+        audio_features_dict = get_tracks_audio_features(
+            [track_info["id"] for track_info in shaped]
+        )
+        page_info = apply_audio_features_page(shaped, audio_features_dict)
+        del audio_features_dict, shaped  # 使わない特性値を手放す
+
+        update_missing_popularity(sp, page_info, seed_cache)
+        yield from page_info
+
+
+# popularityが0のトラックはバッチで詳細情報を取得して更新する
+def update_missing_popularity(sp, page_info, seed_cache=True):
+    info_by_id = {
+        track_info["id"]: track_info
+        for track_info in page_info
+        if track_info["popularity"] == 0
+    }
+    tracks_needing_retry = list(info_by_id)
+    for i in range(0, len(tracks_needing_retry), 50):
+        batch_ids = tracks_needing_retry[i:i + 50]
+        try:
+            for detailed_track in sp.tracks(batch_ids)["tracks"]:
+                if seed_cache and detailed_track:
+                    seed_track_cache(detailed_track)
+                if detailed_track and detailed_track["id"] in info_by_id:
+                    info_by_id[detailed_track["id"]]["popularity"] = detailed_track[
+                        "popularity"
+                    ]
+        except Exception as retry_error:
+            logging.error(f"Failed to update popularity for batch: {retry_error}")
+
+
+# トラックのページのイテレーターから、整形済みトラックを1曲ずつ返す
+# 引数: seed_cache (Falseなら楽曲詳細ページ用のキャッシュを埋めない)
+def iter_track_rows(sp, pages, seed_cache=True):
+    shaped_pages = attach_artist_genres(sp, shape_track_pages(pages, seed_cache))
+    return merge_audio_features(sp, shaped_pages, seed_cache)
+
+
+# プレイリストの情報と遅延取得のトラックリストを返す
+# snapshot_idが変わっていなければキャッシュ済みのリストを再利用する
+# 引数: refresh (Falseならキャッシュがあればプレイリスト情報を取得しない),
+#       count_missing (Falseならネガティブキャッシュのヒット数に数えない。先読み用)
+def load_playlist_tracks(sp, playlist_id, refresh=True, count_missing=True):
+    cached = hydrated_tracks.get(("playlist", playlist_id))
+    if cached and not cached.failed and not refresh:
+        return cached
+
+    # プレイリストの詳細情報を取得
+    playlist_details = fetch_unless_missing(
+        "playlist",
+        playlist_id,
+        lambda: sp.playlist(playlist_id, fields=PLAYLIST_FIELDS, market="JP"),
+        count=count_missing,
+    )
+    snapshot_id = playlist_details.get("snapshot_id", "")
+    if cached and not cached.failed and cached.version == snapshot_id:
+        return cached
+
+    total_tracks = (playlist_details.get("tracks") or {}).get("total", 0)
+    meta = {
+        "name": playlist_details.get("name", "No playlist name"),
+        "description": playlist_details.get("description", "No description"),
+        "url": playlist_details.get("external_urls", {}).get("spotify", "#"),
+        "image_url": select_artwork(playlist_details.get("images"), "detail"),
+        "followers": playlist_details["followers"]["total"],
+        "exceeds_max_tracks": total_tracks > MAX_TRACKS,  # 500曲を超えるかどうか
+    }
+    tracks = LazyTrackList(
+        iter_track_rows(sp, iter_playlist_pages(sp, playlist_id)), meta, snapshot_id
+    )
+    hydrated_tracks.set(("playlist", playlist_id), tracks)
+    return tracks
+
+
+# キーワードで楽曲を検索し、遅延取得のトラックリストを返す
+# 検索結果がない場合はNone
+def load_search_tracks(sp, keyword):
+    cached = hydrated_tracks.get(("search", keyword))
+    if cached and not cached.failed:
+        return cached
+    if is_known_missing("track_search", keyword):
+        return None
+
+    # キーワードに基づいて楽曲を検索し、まず最初の50件を取得
+    results = sp.search(q=keyword, type="track", limit=50, market="JP")
+    total_results = results["tracks"]["total"]  # 検索結果の総件数
+
+    # 検索結果の説明メッセージを設定
+    if total_results == 0 or not results["tracks"]["items"]:
+        remember_missing("track_search", keyword)
+        return None
+    elif total_results > 100:
+        description = f"検索結果は{total_results}曲ありますが、最初の100曲のみ表示しています。"
+    else:
+        description = f"検索結果は{total_results}曲です。"
+
+    meta = {
+        "name": keyword,
+        "description": description,
+        "url": "",
+        "image_url": None,
+        "followers": None,
+        "exceeds_max_tracks": False,
+    }
+    tracks = LazyTrackList(
+        iter_track_rows(sp, iter_search_pages(sp, keyword, results)), meta
+    )
+    hydrated_tracks.set(("search", keyword), tracks)
+    return tracks
+
+
+# アルバムの収録曲を遅延取得のトラックリストとして返す
+def make_album_tracks(sp, album, first_page):
+    total_results = first_page["total"]
+
+    # 収録曲数の説明メッセージを設定
+    if total_results == 0:
+        description = "検索結果がありません。"
+    else:
+        description = f"収録曲数は{total_results}曲です。"
+
+    meta = {
+        "name": album["name"],
+        "description": description,
+        "url": album["external_urls"]["spotify"],
+        "image_url": select_artwork(album["images"], "detail"),
+        "followers": None,
+        "exceeds_max_tracks": False,
+    }
+    return LazyTrackList(
+        iter_track_rows(sp, iter_album_pages(sp, album, first_page)), meta
+    )
+
+
+# キーワードでアルバムを検索し、最初に見つかったアルバムの収録曲を返す
+# 検索結果がない場合はNone
+def load_album_search_tracks(sp, keyword):
+    cached = hydrated_tracks.get(("album_search", keyword))
+    if cached and not cached.failed:
+        return cached
+    if is_known_missing("album_search", keyword):
+        return None
+
+    results = sp.search(q=keyword, type="album", limit=1, market="JP")
+    if not results["albums"]["items"]:
+        remember_missing("album_search", keyword)
+        return None
+
+    album = results["albums"]["items"][0]
+    album_tracks = sp.album_tracks(album["id"], market="JP")
+    tracks = make_album_tracks(sp, album, album_tracks)
+    hydrated_tracks.set(("album_search", keyword), tracks)
+    return tracks
+
+
+# アルバムIDから収録曲を遅延取得のトラックリストとして返す
+def load_album_tracks(sp, album_id):
+    cached = hydrated_tracks.get(("album", album_id))
+    if cached and not cached.failed:
+        return cached
+
+    album = fetch_unless_missing(
+        "album", album_id, lambda: sp.album(album_id, market="JP")
+    )
+    tracks = make_album_tracks(sp, album, album["tracks"])
+    hydrated_tracks.set(("album", album_id), tracks)
+    return tracks
+
+
+# --- 複数プレイリストの統合 ---
+MAX_MERGE_PLAYLISTS = 10  # 一度に統合できる最大プレイリスト数
+MERGE_WORKERS = int(os.environ.get("MERGE_WORKERS", 4))  # 並行して取得するプレイリスト数
+merge_executor = ThreadPoolExecutor(max_workers=MERGE_WORKERS, thread_name_prefix="merge")
+
+
+# クエリパラメータ (playlist_ids: カンマ区切りのID、または category: カテゴリ名) から
+# 統合するプレイリストIDのリストを返す。統合の指定がなければ空のリスト
+def merge_playlist_ids(args):
+    category = args.get("category")
+    if category:
+        playlist_ids = [
+            playlist_id
+            for playlist_id, _ in get_playlist_catalog().grouped.get(category, [])
+        ]
+    else:
+        playlist_ids = []
+        for playlist_id in args.get("playlist_ids", "").split(","):
+            playlist_id = playlist_id.strip()
+            if playlist_id.isalnum() and playlist_id not in playlist_ids:
+                playlist_ids.append(playlist_id)
+    return playlist_ids[:MAX_MERGE_PLAYLISTS]
+
+
+def is_merge_request(args):
+    return bool(args.get("playlist_ids") or args.get("category"))
+
+
+# 統合用に1つのプレイリストのトラックを取得する
+# 整形済みのトラックリストがキャッシュにあれば再利用し、なければオーディオ特性を
+# 結合する前の段階まで取得する (オーディオ特性は統合後にまとめて取得する)
+# 戻り値: (プレイリスト名, トラック情報のリスト)
+def load_merge_source(sp, playlist_id):
+    cached = hydrated_tracks.get(("playlist", playlist_id))
+    if cached and not cached.failed:
+        return cached.meta["name"], cached.all()
+
+    details = fetch_unless_missing(
+        "playlist",
+        playlist_id,
+        lambda: sp.playlist(playlist_id, fields="name", market="JP"),
+    )
+    pages = attach_artist_genres(sp, shape_track_pages(iter_playlist_pages(sp, playlist_id)))
+    rows = [track_info for page in pages for track_info in page]
+    return details.get("name", playlist_id), rows
+
+
+# 複数のプレイリストを並行して取得し、トラックIDで重複を除いて1つのリストにする
+# 各トラックには、そのトラックを含むプレイリストの一覧 (source_playlists) を付ける
+def load_merged_tracks(sp, playlist_ids):
+    cache_key = ("merge", tuple(playlist_ids))
+    cached = hydrated_tracks.get(cache_key)
+    if cached and not cached.failed:
+        return cached
+
+    # ワーカーでもurl_for (画像のないトラックのデフォルト画像) を使えるよう、
+    # リクエストのコンテキストを引き継いで実行する
+    futures = [
+        merge_executor.submit(
+            copy_current_request_context(load_merge_source), sp, playlist_id
+        )
+        for playlist_id in playlist_ids
+    ]
+    merged = {}  # トラックID -> トラック情報 (最初に見つかった順)
+    source_names = []
+    for playlist_id, future in zip(playlist_ids, futures):
+        try:
+            name, rows = future.result()
+        except Exception as e:
+            if not is_missing_error(e):
+                raise
+            logging.warning(f"統合対象のプレイリストを取得できませんでした: {playlist_id}")
+            continue
+        source_names.append(name)
+        source = {"id": playlist_id, "name": name}
+        for track_info in rows:
+            entry = merged.get(track_info["id"])
+            if entry is None:
+                # キャッシュ済みのトラック情報を書き換えないようにコピーする
+                entry = merged[track_info["id"]] = dict(track_info, source_playlists=[])
+            if source not in entry["source_playlists"]:
+                entry["source_playlists"].append(source)
+    if not source_names:
+        return None
+
+    # オーディオ特性は重複を除いたトラックについてまとめて取得する
+    rows = list(merged.values())
+    missing_features = [track_info["id"] for track_info in rows if "tempo" not in track_info]
+    audio_features_dict = get_tracks_audio_features(missing_features)
+    rows = [
+        track_info
+        for track_info in (
+            track_info
+            if "tempo" in track_info
+            else apply_audio_features(track_info, audio_features_dict.get(track_info["id"]))
+            for track_info in rows
+        )
+        if track_info is not None
+    ]
+    update_missing_popularity(sp, rows)
+
+    meta = {
+        "name": " / ".join(source_names),
+        "description": f"{len(source_names)}件のプレイリストから{len(rows)}曲 (重複を除く)",
+        "url": "",
+        "image_url": None,
+        "followers": None,
+        "exceeds_max_tracks": False,
+    }
+    tracks = LazyTrackList.from_rows(rows, meta)
+    hydrated_tracks.set(cache_key, tracks)
+    return tracks
+
+
+# クエリパラメータから表示対象 (プレイリスト・曲検索・アルバム) を決めて
+# 遅延取得のトラックリストを返す。検索結果がない場合はNone
+def load_track_source(sp, args, refresh=True):
+    keyword = args.get("keyword")  # クエリからキーワードを受け取る
+    search_type = args.get("search_type", "track")  # クエリから検索タイプを受け取る
+
+    if keyword and search_type == "album":
+        return load_album_search_tracks(sp, keyword)
+    if keyword:
+        return load_search_tracks(sp, keyword)
+    if args.get("album_id"):
+        return load_album_tracks(sp, args["album_id"])
+    if is_merge_request(args):
+        playlist_ids = merge_playlist_ids(args)
+        return load_merged_tracks(sp, playlist_ids) if playlist_ids else None
+
+    # デフォルトIDかクエリパラメータIDを設定
+    playlist_id = args.get("playlist_id", get_playlist_catalog().default_playlist_id)
+    return load_playlist_tracks(sp, playlist_id, refresh=refresh)
+
+
 def camelot_to_sort_key(camelot_key):
-    # Camelot Keyを数値に変換する
-    if camelot_key == "N/A":
-        return float("inf")  # N/Aを最後に配置
-    key_number, scale = int(camelot_key[:-1]), camelot_key[-1]
-    # Aは偶数、Bは奇数として処理
-    scale_number = 0 if scale == "A" else 1
-    # 10A なら 10 * 2 = 20, 10B なら 10 * 2 + 1 = 21
-    return key_number * 2 + scale_number
+    # Camelot Keyを数値に変換する (10A なら 20, 10B なら 21)。N/Aは最後に配置
+    return CAMELOT_SORT_CODES.get(camelot_key, float("inf"))
 
 
 def format_tempo(tempo):
     return round(float(tempo), 0)
 
 
+# ソート種別ごとのソートキー
+SORT_KEYS = {
+    # ソート基準を BMP と Camelot Key で行う
+    "bpm": lambda x: (
+        format_tempo(x["tempo"]),
+        camelot_to_sort_key(x["camelot_key_signature"]),
+    ),
+    # ソート基準を Camelot Key と BPM で行う
+    "camelot": lambda x: (
+        camelot_to_sort_key(x["camelot_key_signature"]),
+        format_tempo(x["tempo"]),
+    ),
+    "popularity": lambda x: x["popularity"],
+}
+
+
+# クエリパラメータ (sort, order) に従ってトラックを並べ替える
+def sort_tracks(tracks, args):
+    sort_key = SORT_KEYS.get(args.get("sort"))
+    if sort_key is None:
+        return tracks
+    reverse_sort = args.get("order", "asc") == "desc"  # デフォルトは昇順
+    return sorted(tracks, key=sort_key, reverse=reverse_sort)
+
+
+# クエリパラメータ (bpm_min, bpm_max, camelot) でトラックを絞り込む
+def filter_tracks(tracks, args):
+    bpm_min = args.get("bpm_min", type=float)
+    bpm_max = args.get("bpm_max", type=float)
+    camelot = args.get("camelot")
+    genre = (args.get("genre") or "").strip().lower()  # ジャンル名の一部 (大文字小文字を区別しない)
+    if bpm_min is None and bpm_max is None and not camelot and not genre:
+        return tracks
+
+    return [
+        track
+        for track in tracks
+        if (bpm_min is None or format_tempo(track["tempo"]) >= bpm_min)
+        and (bpm_max is None or format_tempo(track["tempo"]) <= bpm_max)
+        and (not camelot or track["camelot_key_signature"] == camelot)
+        and (not genre or any(genre in name.lower() for name in track.get("genres", [])))
+    ]
+
+
+# ソートや絞り込みの指定があるかどうか
+# 指定がある場合は全トラックを取得してから並べ替える必要がある
+def needs_all_tracks(args):
+    return args.get("sort") in SORT_KEYS or any(
+        args.get(name) for name in ("bpm_min", "bpm_max", "camelot", "genre")
+    )
+
+
+# 表示するトラックの1ページ分を返す
+# 引数: tracks (LazyTrackList), args (クエリパラメータ), offset, limit
+# 戻り値: (トラック情報のリスト, 次のページがあるかどうか)
+def select_track_page(tracks, args, offset, limit):
+    if needs_all_tracks(args):
+        rows = sort_tracks(filter_tracks(tracks.all(), args), args)
+        return rows[offset:offset + limit], offset + limit < len(rows)
+
+    # 並べ替えがなければ、必要なページまでだけSpotifyから取得する
+    page = tracks.slice(offset, offset + limit)
+    return page, not tracks.complete or len(tracks) > offset + limit
+
+
+# ページング用カーソルの作成と解析 (中身はトラックの位置)
+def encode_cursor(offset):
+    return base64.urlsafe_b64encode(f"o:{offset}".encode("ascii")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return 0
+    try:
+        prefix, offset = base64.urlsafe_b64decode(cursor.encode("ascii")).split(b":")
+        if prefix != b"o" or int(offset) < 0:
+            raise ValueError
+        return int(offset)
+    except (ValueError, binascii.Error):
+        raise ValueError("Invalid cursor")
+
+
+# ストリーミング描画で一度に送信するトラック数
+STREAM_CHUNK_TRACKS = 25
+
+# トラック一覧の行のHTMLキャッシュ
+# 行のHTMLは位置に依存しない (番号はCSS、再生位置はJavaScriptで求める) ため、
+# トラックIDと、同じトラックでも変わりうる表示項目をキーにして、一度描画した行を使い回す
+row_fragment_cache = TTLCache(
+    maxsize=int(os.environ.get("ROW_FRAGMENT_CACHE_SIZE", 8192)), ttl=60 * 60
+)
+
+
+# 曲名やアートワーク、オーディオ特性はトラックIDで決まるため、IDに加えて
+# 変わりうる項目 (人気度と、統合表示での収録プレイリスト) だけをキーに含める
+# ハッシュを計算しないため、キャッシュに当たらない行でも全件描画より遅くならない
+# 行が参照する静的ファイル (デフォルト画像) のURLもフィンガープリント込みでキーに含め、
+# 静的ファイルを差し替えたら描画し直す
+def row_fragment_keys(tracks):
+    prefix = (request.script_root, default_artwork_url())
+    keys = []
+    for track in tracks:
+        sources = track.get("source_playlists")
+        keys.append(
+            prefix
+            + (
+                track["id"],
+                track.get("popularity"),
+                tuple(source["name"] for source in sources) if sources else None,
+            )
+        )
+    return keys
+
+
+# まとめて描画した行を分割するための区切り (行のHTMLには現れない制御文字)
+ROW_FRAGMENT_SEPARATOR = "\x00"
+
+
+# トラック一覧の行をまとめて描画する。キャッシュにない行だけテンプレートを描画する
+# キャッシュにない行は1回のrender_templateでまとめて描画し、コンテキストプロセッサーや
+# テンプレートのシグナルを通常どおり適用する
+# 引数: tracks (トラック情報のリスト)
+# 戻り値: 連結した行のHTML (Markup)
+def render_track_rows(tracks):
+    keys = row_fragment_keys(tracks)
+    fragments = [row_fragment_cache.get(key) for key in keys]
+    missing = [i for i, fragment in enumerate(fragments) if fragment is None]
+    if missing:
+        rendered = render_template(
+            "track_rows.html",
+            tracks=[tracks[i] for i in missing],
+            separator=ROW_FRAGMENT_SEPARATOR,
+        ).split(ROW_FRAGMENT_SEPARATOR)
+        if len(rendered) != len(missing):
+            # 曲名などに区切りの文字が含まれていた場合は、1行ずつ描画し直す
+            rendered = [
+                render_template("track_rows.html", tracks=[tracks[i]], separator="")
+                for i in missing
+            ]
+        for i, fragment in zip(missing, rendered):
+            fragments[i] = fragment
+            row_fragment_cache.set(keys[i], fragment)
+    return Markup("\n".join(fragments))
+
+
+# トラック一覧の行を、トラックの取得に合わせて少しずつ描画するイテレーター
+# テンプレートの後半 (JSON-LDやスクリプト) では、描画済みのトラックと
+# 次ページのカーソルを tracks / next_cursor 属性から参照する
+class TrackRowStream:
+    def __init__(self, tracks, args, limit=FIRST_SCREEN_TRACKS):
+        self.tracks = []  # 描画済みのトラック
+        self.next_cursor = None
+        self.failed = False  # 描画中にトラックの取得が失敗したかどうか
+        self._source = tracks
+        self._args = args
+        self._limit = limit
+
+    def __iter__(self):
+        offset = 0
+        has_more = False
+        try:
+            while offset < self._limit:
+                # Spotifyからの取得を待つ前に、ここまでの出力を送信させる
+                yield Markup("")
+                rows, has_more = select_track_page(
+                    self._source,
+                    self._args,
+                    offset,
+                    min(STREAM_CHUNK_TRACKS, self._limit - offset),
+                )
+                if rows:
+                    self.tracks.extend(rows)
+                    yield render_track_rows(rows)
+                offset += len(rows)
+                if not rows or not has_more:
+                    break
+        except Exception as e:
+            # ヘッダー送信後はエラーページに切り替えられないため、一覧をここで打ち切り、
+            # 途中までの一覧であることをページに示す
+            logging.error(f"トラック一覧の描画中にエラーが発生しました: {e}")
+            self.failed = True
+            has_more = False
+            yield Markup(
+                '<p class="track-list-error">'
+                "トラックの一部を取得できませんでした。再読み込みしてください。</p>"
+            )
+        self.next_cursor = encode_cursor(offset) if has_more else None
+        # 一覧から開かれやすいアーティストページに備えて先読みする
+        schedule_artist_prefetch(self.tracks)
+
+
+# ストリーミング中にトラックの取得が失敗したことを表す
+# ヘッダー送信後はno-storeに切り替えられないため、レスポンスの終端を送らずに接続を閉じさせ、
+# ブラウザや共有キャッシュに途中までのページを完全なものとして保存させない
+class IncompleteStreamError(Exception):
+    pass
+
+
+# ページ全体を送信した後、一覧の描画が失敗していればIncompleteStreamErrorを送出する
+def fail_incomplete_stream(chunks, track_stream):
+    yield from chunks
+    if track_stream.failed:
+        raise IncompleteStreamError("トラック一覧が途中で打ち切られたため、レスポンスを中断します")
+
+
 # インデックスページのルーティング処理
 @app.route("/")
 def index():
     try:
         # Spotifyクライアントを取得
         sp = get_spotify_client()
+        catalog = get_playlist_catalog()
 
         keyword = request.args.get("keyword")  # クエリからキーワードを受け取る
-        search_type = request.args.get(
-            "search_type", "track"
-        )  # クエリから検索タイプを受け取る
-
-        # デフォルトIDかクエリパラメータIDを設定
-        playlist_id = request.args.get("playlist_id", default_playlist_id)
-
-        if keyword:
-            if search_type == "album":
-                # アルバム検索処理
-                results = sp.search(q=keyword, type="album", limit=1, market="JP")
-                if not results["albums"]["items"]:
-                    return render_template("index.html", error="検索結果がありません。")
-
-                album = results["albums"]["items"][0]
-                album_id = album["id"]
-
-                # アルバムの楽曲を取得
-                album_tracks = sp.album_tracks(album_id, market="JP")
-                all_tracks = album_tracks["items"]
-
-                # アルバムのアートワークを各楽曲のアートワークとして設定
-                for track in all_tracks:
-                    track["album"] = album  # アルバム情報を各トラックに追加
-
-                total_results = album_tracks["total"]
-
-                # 検索結果が50件を超える場合、次の50件を追加で取得
-                while len(all_tracks) < total_results:
-                    additional_results = sp.album_tracks(
-                        album_id, offset=len(all_tracks), market="JP"
-                    )
-                    all_tracks.extend(additional_results["items"])
-
-                track_ids = [track["id"] for track in all_tracks]
-
-                # 検索結果の説明メッセージを設定
-                if total_results == 0:
-                    playlist_description = "検索結果がありません。"
-                elif total_results > 100:
-                    playlist_description = f"収録曲数は{total_results}曲ありますが、最初の100曲のみ表示しています。"
-                else:
-                    playlist_description = f"収録曲数は{total_results}曲です。"
-
-                playlist_name = album["name"]
-                collage_filename = (
-                    album["images"][0]["url"]
-                    if album["images"]
-                    else url_for("static", filename="tunenest.jpg", _external=True)
-                )
-                playlist_url = album["external_urls"]["spotify"]
-                exceeds_max_tracks = False
-                playlist_followers = None
-
-            else:
-                # キーワードに基づいて楽曲を検索し、まず最初の50件を取得
-                results = sp.search(q=keyword, type="track", limit=50, market="JP")
-                track_ids = [track["id"] for track in results["tracks"]["items"]]
-                total_results = results["tracks"]["total"]  # 検索結果の総件数
-
-                # 最初の50件を結果リストに格納
-                all_tracks = results["tracks"]["items"]
-
-                # 検索結果が50件を超える場合、次の50件を追加で取得
-                if total_results > 50:
-                    additional_results = sp.search(
-                        q=keyword, type="track", limit=50, offset=50, market="JP"
-                    )
-                    all_tracks.extend(additional_results["tracks"]["items"])
-                    track_ids.extend(
-                        [track["id"] for track in additional_results["tracks"]["items"]]
-                    )
-
-                # 検索結果の説明メッセージを設定
-                if total_results == 0:
-                    playlist_description = "検索結果がありません。"
-                elif total_results > 100:
-                    playlist_description = f"検索結果は{total_results}曲ありますが、最初の100曲のみ表示しています。"
-                else:
-                    playlist_description = f"検索結果は{total_results}曲です。"
-
-                # キーワード検索の結果を all_tracks として扱う
-                all_tracks = [{"track": track} for track in results["tracks"]["items"]]
-                playlist_name = keyword
-                collage_filename = url_for(
-                    "static", filename="tunenest.jpg", _external=True
-                )
-                playlist_url = ""
-                exceeds_max_tracks = False
-                playlist_followers = None
-        else:
-            # プレイリストの詳細情報を取得
-            playlist_details = sp.playlist(playlist_id, market="JP")
 
-            # プレイリストのフォロワー数を取得
-            playlist_followers = playlist_details["followers"]["total"]
+        # HTTPキャッシュ用 (プレイリスト表示の場合のみ設定)
+        etag = None
+        last_modified = None
+
+        tracks = load_track_source(sp, request.args)
+        if tracks is None:
+            return render_template("index.html", error="検索結果がありません。")
+        meta = tracks.meta
+
+        collage_filename = meta["image_url"] or url_for(
+            "static", filename="tunenest.jpg", _external=True
+        )  # デフォルト値
+        playlist_name = meta["name"]
+        playlist_description = meta["description"]
+
+        if (
+            not keyword
+            and not request.args.get("album_id")
+            and not is_merge_request(request.args)
+        ):
+            # snapshot_idからETagを作成し、変更がなければトラック取得前に304を返す
+            playlist_id = request.args.get("playlist_id", catalog.default_playlist_id)
+            version, last_modified = entity_version("playlist", playlist_id, tracks.version)
+            etag = make_etag(
+                "playlist", playlist_id, version, catalog.version, request.query_string
+            )
+            not_modified = conditional_response(etag, last_modified)
+            if not_modified:
+                return not_modified
 
             # クエリパラメータからプレイリスト説明を取得
             custom_description = request.args.get("description")
             if custom_description:
                 playlist_description = custom_description
-            else:
-                # プレイリストのdescriptionを取得
-                playlist_description = playlist_details.get(
-                    "description", "No description"
-                )
-
-            # プレイリストのURLを取得
-            playlist_url = playlist_details.get("external_urls", {}).get("spotify", "#")
-
-            # 現実のプレイリスト名を取得
-            actual_playlist_name = playlist_details.get("name", "No playlist name")
 
             # クエリパラメータか現実のプレイリスト名を取得
             # ドロップリストではプレイリスト名を渡していないので
             # 通常クエリパラメータを与えられることはありません
-            playlist_name = request.args.get("playlist_name", actual_playlist_name)
+            playlist_name = request.args.get("playlist_name", playlist_name)
 
             # クエリパラメータからカバー画像のURLを取得
             custom_artwork_img = request.args.get("artwork_img")
-
-            # プレイリストのカバー画像URLを安全に取得
-            collage_filename = url_for(
-                "static", filename="tunenest.jpg", _external=True
-            )  # デフォルト値
             if custom_artwork_img:
                 collage_filename = url_for(
                     "static", filename=custom_artwork_img, _external=True
                 )
-            elif playlist_details.get("images") and playlist_details["images"]:
-                # プレイリストのimagesが存在し、空のリストでないことを確認
-                collage_filename = playlist_details["images"][0].get(
-                    "url", collage_filename
-                )
-
-            # プレイリストのトラックを取得
-            MAX_TRACKS = 500  # 最大取得曲数を定義
-
-            offset = 0
-            limit = 100  # 1回のAPI呼び出しで取得できる最大トラック数
-            all_tracks = []  # 全トラックを格納するリスト
-
-            exceeds_max_tracks = False  # 500曲以上かどうかのフラグ
-
-            while True:
-                results = sp.playlist_tracks(
-                    playlist_id, offset=offset, limit=limit, market="JP"
-                )
-                if results is None or results["items"] is None:
-                    raise ValueError("Spotify APIが正常な値を返しませんでした。")
-
-                all_tracks.extend(results["items"])
-
-                # 上限に達した場合、ループを抜ける
-                if len(all_tracks) > MAX_TRACKS:
-                    exceeds_max_tracks = True
-                    all_tracks = all_tracks[:MAX_TRACKS]
-                    break
-
-                # 全てのトラックを取得した場合、ループを抜ける
-                if len(results["items"]) < limit:
-                    break
-
-                offset += limit
-
-            # トラックIDのリストを作成し、オーディオ特性を取得
-            track_ids = [
-                item["track"]["id"]
-                for item in all_tracks
-                if item.get("track") and item["track"].get("id")
-            ]
 
-        # オーディオ特性を取得
-        audio_features_dict = get_tracks_audio_features(track_ids)
-
-        # トラック情報を整形（抜け番対応とNoneチェック）
-        all_tracks_info = []
-        tracks_needing_retry = []
-
-        for item in all_tracks:
-            track = item.get("track", item)  # トラック検索とアルバム検索の両方に対応
-            if track and track["id"] in audio_features_dict:
-                # 対応するオーディオ特性を取得
-                track_features = audio_features_dict[track["id"]]
-                # トラックのpopularityスコアを取得
-                popularity = track.get("popularity", 0)  # 万が一popularityがない場合0を
-                if popularity == 0:
-                    tracks_needing_retry.append(track["id"])
-
-                # オーディオ特性とpopularityを引数として渡す
-                track_info = get_track_info(track, track_features)
-                track_info["popularity"] = (
-                    popularity  # popularity情報をtrack_infoに追加
-                )
-                if track_info is not None:  # track_infoがNoneでないことを確認
-                    all_tracks_info.append(track_info)
-
-        # バッチでトラック詳細情報を取得
-        if tracks_needing_retry:
-            batch_size = 50
-            for i in range(0, len(tracks_needing_retry), batch_size):
-                batch_ids = tracks_needing_retry[i:i + batch_size]
-                try:
-                    detailed_tracks = sp.tracks(batch_ids)["tracks"]
-                    for detailed_track in detailed_tracks:
-                        for track_info in all_tracks_info:
-                            if track_info["id"] == detailed_track["id"]:
-                                track_info["popularity"] = detailed_track["popularity"]
-                except Exception as retry_error:
-                    logging.error(
-                        f"Failed to update popularity for batch: {retry_error}"
-                    )
-
-        # 有効なトラック情報のみをフィルタリング
-        valid_tracks_info = [track for track in all_tracks_info if track]
-
-        sort_order = request.args.get("order", "asc")  # デフォルトは昇順
-        reverse_sort = True if sort_order == "desc" else False
-
-        # トラックソートの処理
-        # クエリパラメータから 'sort' の値を取得、デフォルトは None または ''
-        sort_by = request.args.get("sort", default=None)
-        if sort_by == "bpm":
-            # ソート基準を BMP と Camelot Key で行う
-            valid_tracks_info.sort(
-                key=lambda x: (
-                    format_tempo(x["tempo"]),
-                    camelot_to_sort_key(x["camelot_key_signature"]),
-                ),
-                reverse=reverse_sort,
-            )
-        elif sort_by == "camelot":
-            # ソート基準を Camelot Key と BPM で行う
-            valid_tracks_info.sort(
-                key=lambda x: (
-                    camelot_to_sort_key(x["camelot_key_signature"]),
-                    format_tempo(x["tempo"]),
-                ),
-                reverse=reverse_sort,
-            )
-        elif sort_by == "popularity":
-            valid_tracks_info.sort(key=lambda x: x["popularity"], reverse=reverse_sort)
-
-        # HTMLテンプレートをレンダリング
-        return render_template(
+        # HTMLテンプレートをストリーミングでレンダリング
+        # ヘッダー部分を先に送信し、最初の画面のトラックは取得でき次第送信する
+        # 残りはスクロールに合わせて /api/tracks から読み込む
+        track_stream = TrackRowStream(tracks, request.args)
+        response = stream_page(
             "index.html",
             playlist_name=playlist_name,
-            playlists_grouped=playlists_grouped,  # 追加
-            tracks=valid_tracks_info,
+            catalog_options=catalog.options_html,
+            track_stream=track_stream,
             collage_filename=collage_filename,
             playlist_description=playlist_description,
-            playlist_url=playlist_url,
-            exceeds_max_tracks=exceeds_max_tracks,
-            default_playlist_id=default_playlist_id,
-            playlist_followers=playlist_followers,
+            playlist_url=meta["url"],
+            exceeds_max_tracks=meta["exceeds_max_tracks"],
+            default_playlist_id=catalog.default_playlist_id,
+            playlist_followers=meta["followers"],
         )
+        # ETagはsnapshot_idとクエリだけで決まるため、トラックの取得状況によらず付ける
+        # 一覧が途中で打ち切られた場合は、レスポンスを完了させずにキャッシュへの保存を防ぐ
+        response.response = fail_incomplete_stream(response.response, track_stream)
+        if etag and tracks.version and not tracks.failed:
+            set_cache_headers(response, etag, last_modified)
+        else:
+            response.cache_control.no_store = True
+        return response
     except Exception as e:
         # エラーページを表示
-        error_str = str(e)
-        if "Unsupported URL / URI" in error_str:
+        if is_missing_error(e):
             user_message = (
                 "Invalid or private playlist ID."
                 "Please confirm your playlist ID or make it public."
@@ -544,18 +2058,83 @@ def index():
         return render_template("error.html", error=user_message)
 
 
+# 整形済みトラックをカーソル単位で返すAPI
+# クエリパラメータ: playlist_id / keyword (+ search_type) / album_id / playlist_ids / category,
+#   cursor (前回のnext_cursor), limit, sort, order, bpm_min, bpm_max, camelot, genre
+# 戻り値: トラック情報、描画済みの行HTML、次ページのカーソルを含むJSON
+@app.route("/api/tracks", methods=["GET"])
+def api_tracks():
+    try:
+        offset = decode_cursor(request.args.get("cursor"))
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+    limit = request.args.get("limit", FIRST_SCREEN_TRACKS, type=int)
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
+
+    try:
+        sp = get_spotify_client()
+        tracks = load_track_source(sp, request.args, refresh=False)
+        if tracks is None:
+            return jsonify({"tracks": [], "html": "", "next_cursor": None})
+        page, has_more = select_track_page(tracks, request.args, offset, limit)
+    except Exception as e:
+        logging.error(f"Failed to load tracks: {e}")
+        return jsonify({"error": "Failed to load tracks"}), 502
+    schedule_artist_prefetch(page)
+
+    return jsonify(
+        {
+            "tracks": page,
+            "html": render_track_rows(page),
+            "next_cursor": encode_cursor(offset + len(page)) if has_more else None,
+        }
+    )
+
+
+# Spotify Web APIのベースURL (spotipyが対応していないパラメーターを使う場合に直接呼び出す)
+SPOTIFY_API_BASE = "https://api.spotify.com/v1"
+
+
+# Spotify Web APIにGETリクエストを送り、JSONを返す
+# 引数: sp (Spotifyクライアント。アクセストークンの取得に使う), path (例: "/artists/{id}/albums"),
+#       params (クエリパラメータ)
+# エラーレスポンスの場合はrequests.HTTPErrorを送出する
+def spotify_get(sp, path, params=None):
+    access_token = sp.auth_manager.get_access_token(as_dict=False)  # spotipyから取り出せる
+    headers = {"Authorization": f"Bearer {access_token}"}
+    response = http_session.get(
+        f"{SPOTIFY_API_BASE}{path}", headers=headers, params=params, timeout=10
+    )
+    response.raise_for_status()
+    return response.json()
+
+
 # アーティストの詳細情報とトップ曲、最新のアルバムを取得
 # 引数: artist_id (SpotifyのアーティストID)
 # 戻り値: アーティストの詳細、トップ曲のリスト、最新のアルバムの詳細を含む辞書
 # キャッシュを適用
-@lru_cache(maxsize=128)  # キャッシュのサイズを適宜設定
 def get_cached_artist_details(artist_id, sp):
-    # 既に取得したSpotifyクライアントを使用する
-    artist = sp.artist(artist_id)
+    details = artist_cache.get(artist_id)
+    if details is None:
+        # 既に取得したSpotifyクライアントを使用する
+        artist = sp.artist(artist_id)
+        details = artist_summary(artist)
+        artist_cache.set(artist_id, details)
+        artist_cache_genres(artist)
+    return details
+
+
+# アーティストの基本情報のキャッシュ (トラック一覧からの先読みでも埋める)
+artist_cache = TTLCache(maxsize=2048, ttl=60 * 60)
+
+
+# Spotify APIのアーティスト辞書から、詳細ページで使う項目を取り出す
+def artist_summary(artist):
     return {
         "id": artist["id"],
         "name": artist["name"],
-        "image_url": artist["images"][0]["url"] if artist["images"] else None,
+        "image_url": select_artwork(artist["images"], "detail"),
+        "image_srcset": artwork_srcset(artist["images"]),
         "popularity": artist["popularity"],
         "genres": artist["genres"],
         "followers": artist["followers"]["total"],
@@ -563,70 +2142,371 @@ def get_cached_artist_details(artist_id, sp):
     }
 
 
-def get_artist_details(artist_id):
-    # Spotifyクライアントを取得
-    sp = get_spotify_client()
+# --- アーティスト情報の先読み ---
+# トラック一覧に表示したアーティストの基本情報を、優先度の低いバックグラウンド処理で
+# 複数アーティスト取得API (50件ずつ) からまとめて取得しておく
+ARTIST_PREFETCH_BUDGET = int(os.environ.get("ARTIST_PREFETCH_BUDGET", 100))  # 1回あたりの上限
+ARTIST_PREFETCH_MAX_PENDING = 4  # 待機中の先読みがこれ以上あれば新たに追加しない
+prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+prefetch_lock = Lock()
+prefetch_pending = 0
+prefetch_in_flight = set()  # 取得予定のアーティストID
 
-    # キャッシュされたアーティストの基本情報を取得
-    artist_details = get_cached_artist_details(artist_id, sp)
 
-    # アーティストのトップ曲を取得
+def prefetch_artists(artist_ids):
+    global prefetch_pending
+    try:
+        sp = get_spotify_client()
+        for i in range(0, len(artist_ids), 50):
+            batch = artist_ids[i:i + 50]
+            for artist in sp.artists(batch)["artists"]:
+                if artist:
+                    artist_cache.set(artist["id"], artist_summary(artist))
+                    artist_cache_genres(artist)
+    except Exception as e:
+        logging.warning(f"アーティスト情報の先読みに失敗しました: {e}")
+    finally:
+        with prefetch_lock:
+            prefetch_pending -= 1
+            prefetch_in_flight.difference_update(artist_ids)
+
+
+# カタログに追加されたプレイリストを先読みする (最初の画面の分までトラックを取得する)
+def prewarm_playlists(playlist_ids):
+    global prefetch_pending
+    try:
+        sp = get_spotify_client()
+        for playlist_id in playlist_ids:
+            try:
+                load_playlist_tracks(sp, playlist_id, count_missing=False).slice(
+                    0, FIRST_SCREEN_TRACKS
+                )
+            except Exception as e:
+                logging.warning(f"プレイリスト {playlist_id} の先読みに失敗しました: {e}")
+    finally:
+        with prefetch_lock:
+            prefetch_pending -= 1
+
+
+# 整形にはurl_for (デフォルト画像のURL) を使うため、リクエスト処理中に限り、
+# そのコンテキストを引き継いで先読みする
+def schedule_playlist_prewarm(playlist_ids):
+    global prefetch_pending
+    if not playlist_ids or not has_request_context():
+        return
+    with prefetch_lock:
+        prefetch_pending += 1
+    prefetch_executor.submit(
+        copy_current_request_context(prewarm_playlists), playlist_ids
+    )
+
+
+# トラック一覧の行に含まれるアーティストのうち、未取得のものを先読みする
+def schedule_artist_prefetch(rows):
+    global prefetch_pending
+    with prefetch_lock:
+        if ARTIST_PREFETCH_BUDGET <= 0 or prefetch_pending >= ARTIST_PREFETCH_MAX_PENDING:
+            return
+        artist_ids = []
+        for row in rows:
+            artist_id = row.get("artist_id")
+            if (
+                not artist_id
+                or artist_id in prefetch_in_flight
+                or artist_id in artist_ids
+                or is_known_missing("artist", artist_id, count=False)
+                or artist_cache.get(artist_id) is not None
+            ):
+                continue
+            artist_ids.append(artist_id)
+            if len(artist_ids) >= ARTIST_PREFETCH_BUDGET:
+                break
+        if not artist_ids:
+            return
+        prefetch_pending += 1
+        prefetch_in_flight.update(artist_ids)
+    prefetch_executor.submit(prefetch_artists, artist_ids)
+
+
+# --- 関連アーティストのグラフ ---
+# アーティストを整数の番号で管理し、関連アーティストを番号の配列 (隣接リスト) で保持する
+# アーティストページの表示や探索のたびに、未取得の隣接リストだけをSpotifyから取得して育てる
+RELATED_ARTISTS_TTL = 7 * 24 * 60 * 60  # 隣接リストを取り直すまでの秒数
+RELATED_FETCH_BUDGET = int(os.environ.get("RELATED_FETCH_BUDGET", 30))  # 1リクエストでの取得上限
+RELATED_FETCH_WORKERS = 4  # 並行して取得する数
+MAX_PATH_HOPS = 6  # 最短経路を探索する最大の距離
+related_executor = ThreadPoolExecutor(
+    max_workers=RELATED_FETCH_WORKERS, thread_name_prefix="related"
+)
+
+
+class ArtistGraph:
+    def __init__(self):
+        self.ids = []  # 番号 -> アーティストID
+        self.names = []  # 番号 -> アーティスト名
+        self.index = {}  # アーティストID -> 番号
+        self.edges = []  # 番号 -> 関連アーティストの番号の配列 (未取得ならNone)
+        self.fetched_at = []  # 番号 -> 隣接リストの取得時刻
+        self._lock = Lock()
+
+    def _node(self, artist_id, name=None):
+        # ロックを取得した状態で呼び出す
+        node = self.index.get(artist_id)
+        if node is None:
+            node = len(self.ids)
+            self.index[artist_id] = node
+            self.ids.append(artist_id)
+            self.names.append(name or "")
+            self.edges.append(None)
+            self.fetched_at.append(0.0)
+        elif name and not self.names[node]:
+            self.names[node] = name
+        return node
+
+    # 引数: name (artist_idのアーティスト名。分かれば関連アーティストと同じく保持する)
+    def set_related(self, artist_id, related_artists, name=None):
+        with self._lock:
+            node = self._node(artist_id, name)
+            self.edges[node] = array.array(
+                "I", [self._node(artist["id"], artist["name"]) for artist in related_artists]
+            )
+            self.fetched_at[node] = time.time()
+
+    # 関連アーティストのIDのリスト。未取得か古くなっていればNone
+    def related(self, artist_id):
+        with self._lock:
+            node = self.index.get(artist_id)
+            if node is None or self.edges[node] is None:
+                return None
+            if time.time() - self.fetched_at[node] > RELATED_ARTISTS_TTL:
+                return None
+            return [self.ids[neighbor] for neighbor in self.edges[node]]
+
+    def describe(self, artist_id):
+        node = self.index.get(artist_id)
+        return {"id": artist_id, "name": self.names[node] if node is not None else ""}
+
+    # 未取得の隣接リストを、予算の範囲内で並行して取得する
+    # 戻り値: 使った予算 (API呼び出し回数)
+    def fetch_missing(self, sp, artist_ids, budget):
+        missing = [
+            artist_id
+            for artist_id in dict.fromkeys(artist_ids)
+            if self.related(artist_id) is None
+            and not is_known_missing("artist", artist_id, count=False)
+        ][: max(budget, 0)]
+
+        def fetch(artist_id):
+            return fetch_unless_missing(
+                "artist",
+                artist_id,
+                lambda: sp.artist_related_artists(artist_id),
+                count=False,
+            )["artists"]
+
+        for artist_id, future in zip(
+            missing, [related_executor.submit(fetch, artist_id) for artist_id in missing]
+        ):
+            try:
+                self.set_related(artist_id, future.result(), cached_artist_name(artist_id))
+            except Exception as e:
+                logging.warning(f"関連アーティストを取得できませんでした ({artist_id}): {e}")
+        return len(missing)
+
+    # artist_idから hops 回たどって到達できるアーティストを、距離ごとに返す
+    def explore(self, sp, artist_id, hops, budget=RELATED_FETCH_BUDGET):
+        distances = {artist_id: 0}
+        frontier = [artist_id]
+        layers = []
+        for hop in range(1, hops + 1):
+            budget -= self.fetch_missing(sp, frontier, budget)
+            layer = []
+            for current in frontier:
+                for neighbor in self.related(current) or []:
+                    if neighbor not in distances:
+                        distances[neighbor] = hop
+                        layer.append(neighbor)
+            layers.append(layer)
+            frontier = layer
+        return layers
+
+    # 2人のアーティストを結ぶ最短経路 (アーティストIDのリスト)。見つからなければNone
+    # 幅優先探索で、未取得の隣接リストは予算の範囲内で取得しながら広げる
+    def shortest_path(self, sp, source_id, target_id, budget=RELATED_FETCH_BUDGET):
+        if source_id == target_id:
+            return [source_id]
+        parents = {source_id: None}
+        frontier = [source_id]
+        for _ in range(MAX_PATH_HOPS):
+            budget -= self.fetch_missing(sp, frontier, budget)
+            next_frontier = []
+            for current in frontier:
+                for neighbor in self.related(current) or []:
+                    if neighbor in parents:
+                        continue
+                    parents[neighbor] = current
+                    if neighbor == target_id:
+                        path = [neighbor]
+                        while parents[path[-1]] is not None:
+                            path.append(parents[path[-1]])
+                        return path[::-1]
+                    next_frontier.append(neighbor)
+            if not next_frontier:
+                break
+            frontier = next_frontier
+        return None
+
+    # スナップショット用の辞書
+    def to_dict(self):
+        with self._lock:
+            return {
+                "ids": list(self.ids),
+                "names": list(self.names),
+                "edges": [None if edges is None else list(edges) for edges in self.edges],
+                "fetched_at": list(self.fetched_at),
+            }
+
+    def load(self, data):
+        with self._lock:
+            if self.ids:
+                return  # 起動後に取得したデータを優先する
+            self.ids = data["ids"]
+            self.names = data["names"]
+            self.index = {artist_id: node for node, artist_id in enumerate(self.ids)}
+            self.edges = [
+                None if edges is None else array.array("I", edges) for edges in data["edges"]
+            ]
+            self.fetched_at = data["fetched_at"]
+
+    def __len__(self):
+        return len(self.ids)
+
+
+artist_graph = ArtistGraph()
+
+
+# アーティストの基本情報のキャッシュにある名前 (なければNone)
+def cached_artist_name(artist_id):
+    artist = artist_cache.get(artist_id)
+    return artist["name"] if artist else None
+
+
+# アーティストの関連アーティスト (グラフに無ければSpotifyから取得して追加する)
+# 戻り値: {"name", "id"} のリスト
+def get_related_artists(sp, artist_id):
+    related = artist_graph.related(artist_id)
+    if related is None:
+        artist_graph.set_related(
+            artist_id,
+            sp.artist_related_artists(artist_id)["artists"],
+            cached_artist_name(artist_id),
+        )
+        related = artist_graph.related(artist_id)
+    return [artist_graph.describe(related_id) for related_id in related]
+
+
+# アーティストのトップ曲のキャッシュ (曲名とIDのみ)
+artist_top_tracks_cache = TTLCache(maxsize=2048, ttl=60 * 60)
+
+
+def get_artist_top_tracks(sp, artist_id):
+    top_tracks_details = artist_top_tracks_cache.get(artist_id)
+    if top_tracks_details is not None:
+        return top_tracks_details
+
     # === Spotipy版（現在は非使用、将来バージョンアップ時に再検討） ===
     # 理由：spotipy.artist_albums()がmarket未対応、日本語表記が取得できない
     # top_tracks = sp.artist_top_tracks(artist_id, country="JP")["tracks"]
 
     # === 現在使用しているrequests版 ===
-    access_token = sp.auth_manager.get_access_token(as_dict=False)
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
-    params = {
-        "market": "JP"  # ← countryではなくmarket！
-    }
-    url = f"https://api.spotify.com/v1/artists/{artist_id}/top-tracks"
-    response = requests.get(url, headers=headers, params=params)
-    top_tracks = response.json()["tracks"]
+    top_tracks = spotify_get(
+        sp,
+        f"/artists/{artist_id}/top-tracks",
+        {"market": "JP"},  # ← countryではなくmarket！
+    )["tracks"]
     # === 現在使用しているrequests版 ===
 
-    top_tracks_details = [
-        {"name": track["name"], "id": track["id"]} for track in top_tracks
-    ]
+    for track in top_tracks:
+        seed_track_cache(track)  # 楽曲詳細ページ用のキャッシュも埋める
+    top_tracks_details = [
+        {"name": track["name"], "id": track["id"]} for track in top_tracks
+    ]
+    artist_top_tracks_cache.set(artist_id, top_tracks_details)
+    return top_tracks_details
+
+
+# アーティストページのETagの元になる情報を、キャッシュ済みのデータだけから集める
+# (基本情報、トップ曲、最新アルバムと収録曲、関連アーティスト)
+# オーディオ特性はほぼ変わらないため含めない。どれかが未取得ならNone
+def cached_artist_page_data(artist_id):
+    artist = artist_cache.get(artist_id)
+    top_tracks = artist_top_tracks_cache.get(artist_id)
+    discography = artist_discography_cache.get(artist_id)
+    related = artist_graph.related(artist_id)
+    if artist is None or top_tracks is None or discography is None or related is None:
+        return None
+    albums = discography["album"]
+    latest_album = albums[0] if albums else None
+    if latest_album and latest_album["tracks"] is None:
+        return None
+    return {
+        "artist": artist,
+        "top_tracks": top_tracks,
+        "latest_album": latest_album and {
+            "id": latest_album["id"],
+            "name": latest_album["name"],
+            "tracks": latest_album["tracks"],
+        },
+        "related": [artist_graph.describe(related_id) for related_id in related],
+    }
+
+
+def get_artist_details(artist_id):
+    # Spotifyクライアントを取得
+    sp = get_spotify_client()
+
+    # キャッシュされたアーティストの基本情報を取得
+    artist_details = get_cached_artist_details(artist_id, sp)
 
-    # アーティストのアルバムを取得し、最新のアルバムを特定
-    # === Spotipy版（現在は非使用、将来バージョンアップ時に再検討） ===
-    # 理由：spotipy.artist_albums()がmarket未対応、日本語表記が取得できない
-    # albums = sp.artist_albums(artist_id, include_groups="album")["items"]
+    # アーティストのトップ曲を取得 (オーディオ特性を付けるため、キャッシュの辞書は複製する)
+    top_tracks_details = [dict(track) for track in get_artist_top_tracks(sp, artist_id)]
 
-    # === 現在使用しているrequests版 ===
-    access_token = sp.auth_manager.get_access_token(as_dict=False)
-    headers = {
-        "Authorization": f"Bearer {access_token}"  # spotipyから取り出せる
-    }
-    params = {
-        "include_groups": "album",
-        "market": "JP",
-        "limit": 20
-    }
-    url = f"https://api.spotify.com/v1/artists/{artist_id}/albums"
-    response = requests.get(url, headers=headers, params=params)
-    albums = response.json()["items"]
-    # === 現在使用しているrequests版 ===
+    # キャッシュされたディスコグラフィーから最新のアルバムを特定
+    albums = get_artist_discography(artist_id)["album"]
 
     latest_album = albums[0] if albums else None
-    latest_album_details = (
-        {"name": latest_album["name"], "id": latest_album["id"], "artist_id": artist_id}
-        if latest_album
-        else None
+    latest_album_details = None
+    complete = True  # 補助的な情報 (収録曲、オーディオ特性) をすべて取得できたか
+    if latest_album:
+        latest_album_details = {
+            "name": latest_album["name"],
+            "id": latest_album["id"],
+            "artist_id": artist_id,
+            "tracks": [],
+        }
+        try:
+            load_release_tracks([latest_album])  # 収録曲はディスコグラフィーのキャッシュに残る
+            latest_album_details["tracks"] = [
+                {"name": track["name"], "id": track["track_id"]}
+                for track in latest_album["tracks"]
+            ]
+        except Exception as e:
+            # 収録曲を取得できなくても、アルバム名だけで表示を続ける
+            logging.warning(f"最新アルバムの収録曲を取得できませんでした: {e}")
+            complete = False
+
+    # トップ曲と最新アルバムの曲のオーディオ特性を、まとめて1回で取得する
+    feature_tracks = top_tracks_details + (
+        latest_album_details["tracks"] if latest_album_details else []
     )
+    if not attach_track_features(feature_tracks):
+        complete = False
 
     # アーティストのSpotifyページへのリンクを追加
     spotify_url = artist_details.get("external_urls", {}).get("spotify")
 
     # 関連アーティストを取得
-    related_artists = sp.artist_related_artists(artist_id)["artists"]
-    related_artists_details = [
-        {"name": artist["name"], "id": artist["id"]} for artist in related_artists
-    ]
+    related_artists_details = get_related_artists(sp, artist_id)
 
     return (
         artist_details,
@@ -634,9 +2514,36 @@ def get_artist_details(artist_id):
         latest_album_details,
         related_artists_details,
         spotify_url,
+        complete,
     )
 
 
+# 曲のリストにオーディオ特性 (BPM、キー、キャメロット) を付ける
+# オーディオ特性はキャッシュ経由でまとめて取得し、取得できない曲は特性なしのまま表示する
+# 戻り値: 取得できた場合はTrue
+def attach_track_features(tracks):
+    try:
+        features_by_id = get_tracks_audio_features(
+            list(dict.fromkeys(track["id"] for track in tracks))
+        )
+    except Exception as e:
+        logging.warning(f"オーディオ特性を取得できませんでした: {e}")
+        return False
+    apply_audio_features_page(tracks, features_by_id)
+    return True
+
+
+# クエリパラメータ (sort, order) に従って曲を並べ替える
+# アーティストページの曲は人気度を持たないため、BPMとキャメロットだけに対応する
+# オーディオ特性のない曲は、並べ替えの対象外として最後に置く
+def sort_artist_tracks(tracks, args):
+    if args.get("sort") not in ("bpm", "camelot"):
+        return tracks
+    with_features = [track for track in tracks if "tempo" in track]
+    without_features = [track for track in tracks if "tempo" not in track]
+    return sort_tracks(with_features, args) + without_features
+
+
 # アルバムIDを使用してアルバムの詳細情報を取得
 # 引数: album_id (SpotifyのアルバムID)
 # 戻り値: アルバムの詳細情報を含む辞書
@@ -657,7 +2564,8 @@ def get_album_details(album_id):
     details = {
         "name": album["name"],  # アルバム名
         "release_date": album["release_date"],  # リリース日
-        "image": album["images"][0]["url"],  # ジャケット画像のURL
+        "image": select_artwork(album["images"], "detail"),  # ジャケット画像のURL
+        "image_srcset": artwork_srcset(album["images"]),
         "artists": [
             {"name": artist["name"], "id": artist["id"]} for artist in album["artists"]
         ],  # 参加アーティスト
@@ -669,19 +2577,65 @@ def get_album_details(album_id):
     return details
 
 
+# アルバム詳細のキャッシュ (人気度が変わるため有効期限付き)
+album_details_cache = TTLCache(maxsize=256, ttl=60 * 60)
+
+
+def cached_get_album_details(album_id):
+    details = album_details_cache.get(album_id)
+    if details is None:
+        details = fetch_unless_missing(
+            "album", album_id, lambda: get_album_details(album_id)
+        )
+        album_details_cache.set(album_id, details)
+    return details
+
+
 # 曲のIDを受け取り、その曲の詳細情報とオーディオ特性を返す
 # (タイムアウト対応版)
 # 引数: song_id (Spotifyの曲ID)
 # 戻り値: 曲の詳細情報とオーディオ特性を含む辞書。
 # 最大リトライ回数を超えた場合はエラーをスローする。
-@lru_cache(maxsize=128)
 def get_cached_track(song_id, sp):
-    return sp.track(song_id)
+    track = track_cache.get(song_id)
+    if track is None:
+        track = compact_track(sp.track(song_id))
+        track_cache.set(song_id, track)
+    return track
+
+
+# 複数のトラック情報をキャッシュ経由で取得する (未取得分は50曲ずつまとめて取得)
+# 引数: sp (Spotifyクライアント), track_ids (トラックIDのリスト)
+# 戻り値: トラックIDをキーとし、compact_trackの戻り値を値とする辞書
+def get_cached_tracks(sp, track_ids):
+    tracks = {}
+    missing_ids = []
+    for track_id in track_ids:
+        track = track_cache.get(track_id)
+        if track is not None:
+            tracks[track_id] = track
+        elif not is_known_missing("track", track_id):
+            missing_ids.append(track_id)
+
+    for i in range(0, len(missing_ids), 50):
+        batch = missing_ids[i:i + 50]
+        for track_id, track in zip(batch, sp.tracks(batch)["tracks"]):
+            if not track:
+                remember_missing("track", track_id)
+                continue
+            tracks[track_id] = compact_track(track)
+            track_cache.set(track_id, tracks[track_id])
+    return tracks
 
 
-@lru_cache(maxsize=128)
 def get_cached_audio_features(song_id, sp):
-    return sp.audio_features([song_id])[0]
+    feature = audio_features_cache.get(song_id)
+    if feature is None:
+        feature = sp.audio_features([song_id])[0]
+        if feature:
+            feature = compact_audio_features(feature)
+            audio_features_cache.set(song_id, feature)
+    return feature
 
 
 def normalize_loudness(loudness):
@@ -693,7 +2647,68 @@ def normalize_loudness(loudness):
     return (loudness + 60) / 0.6  # Normalize to 0-100 scale
 
 
+# トラック情報とオーディオ特性から、楽曲詳細の表示用の辞書を作成する
+# 引数: song_details (compact_trackの戻り値), audio_features (オーディオ特性の辞書)
+# 戻り値: 正規化済みの特性値とキャメロットキーを含む辞書
+def build_song_details(song_details, audio_features):
+    # アルバムのアートワークURLを取得
+    album_images = song_details["album"]["images"]
+    album_artwork_url = select_artwork(album_images, "detail")
+
+    # アルバム名を取得
+    album_name = song_details["album"]["name"]
+
+    # アルバムidを取得
+    album_id = song_details["album"]["id"]
+
+    # リリース日を取得
+    release_date = song_details["album"]["release_date"]
+
+    # アーティスト名を取得（複数の場合あり）
+    artists = [
+        {"name": artist["name"], "id": artist["id"]} for artist in song_details["artists"]
+    ]
+
+    # キャメロットキーを計算
+    camelot_key_value = camelot_key(audio_features["key"], audio_features["mode"])
+
+    # ラウドネスの生の値と正規化された値を取得
+    loudness_raw = audio_features["loudness"]
+    loudness_normalized = normalize_loudness(loudness_raw)
+
+    return {
+        "id": song_details["id"],
+        "acousticness": audio_features["acousticness"] * 100,
+        "danceability": audio_features["danceability"] * 100,
+        "duration": song_details["duration_ms"] / 1000,
+        "energy": audio_features["energy"] * 100,
+        "instrumentalness": audio_features["instrumentalness"] * 100,
+        "key": audio_features["key"],
+        "mode": audio_features["mode"],
+        "name": song_details["name"],
+        "popularity": song_details["popularity"],
+        "tempo": audio_features["tempo"],
+        "time_signature": audio_features["time_signature"],
+        "valence": audio_features["valence"] * 100,
+        "album_artwork_url": album_artwork_url,
+        "album_artwork_srcset": artwork_srcset(album_images),
+        "artists": artists,
+        "camelot_key": camelot_key_value,  # キャメロットキー
+        "album_name": album_name,  # 収録作品（アルバム名）
+        "album_id": album_id,  # 収録作品id （アルバムid）
+        "release_date": release_date,  # 追加されたリリース日
+        "liveness": audio_features["liveness"] * 100,
+        "speechiness": audio_features["speechiness"] * 100,
+        "loudness_normalized": loudness_normalized,
+        "loudness_raw": loudness_raw,
+    }
+
+
 def get_song_details_with_retry(song_id, max_retries=3, delay=5):
+    # 存在しない曲IDはリトライせずにすぐエラーにする
+    if is_known_missing("track", song_id):
+        raise MissingEntityError("track", song_id)
+
     retries = 0
     while retries <= max_retries:
         try:
@@ -703,59 +2718,12 @@ def get_song_details_with_retry(song_id, max_retries=3, delay=5):
             # 曲のオーディオ特性を取得
             audio_features = get_cached_audio_features(song_id, sp)
 
-            # アルバムのアートワークURLを取得
-            album_artwork_url = song_details["album"]["images"][0]["url"]
-
-            # アルバム名を取得
-            album_name = song_details["album"]["name"]
-
-            # アルバムidを取得
-            album_id = song_details["album"]["id"]
-
-            # リリース日を取得
-            release_date = song_details["album"]["release_date"]
-
-            # アーティスト名を取得（複数の場合あり）
-            artists = [
-                {"name": artist["name"], "id": artist["id"]}
-                for artist in song_details["artists"]
-            ]
-
-            # キャメロットキーを計算
-            camelot_key_value = camelot_key(
-                audio_features["key"], audio_features["mode"]
-            )
-
-            # ラウドネスの生の値と正規化された値を取得
-            loudness_raw = audio_features["loudness"]
-            loudness_normalized = normalize_loudness(loudness_raw)
-
             # 成功した場合、曲の詳細情報を返す
-            return {
-                "acousticness": audio_features["acousticness"] * 100,
-                "danceability": audio_features["danceability"] * 100,
-                "duration": song_details["duration_ms"] / 1000,
-                "energy": audio_features["energy"] * 100,
-                "instrumentalness": audio_features["instrumentalness"] * 100,
-                "key": audio_features["key"],
-                "mode": audio_features["mode"],
-                "name": song_details["name"],
-                "popularity": song_details["popularity"],
-                "tempo": audio_features["tempo"],
-                "time_signature": audio_features["time_signature"],
-                "valence": audio_features["valence"] * 100,
-                "album_artwork_url": album_artwork_url,
-                "artists": artists,
-                "camelot_key": camelot_key_value,  # キャメロットキー
-                "album_name": album_name,  # 収録作品（アルバム名）
-                "album_id": album_id,  # 収録作品id （アルバムid）
-                "release_date": release_date,  # 追加されたリリース日
-                "liveness": audio_features["liveness"] * 100,
-                "speechiness": audio_features["speechiness"] * 100,
-                "loudness_normalized": loudness_normalized,
-                "loudness_raw": loudness_raw,
-            }
+            return build_song_details(song_details, audio_features)
         except Exception as e:  # タイムアウトやその他の例外をキャッチ
+            if is_missing_error(e):
+                remember_missing("track", song_id)
+                raise
             logging.error(f"An error occurred: {e}. Retrying...")
             retries += 1
             time.sleep(delay)  # delay秒待ってからリトライ
@@ -763,262 +2731,317 @@ def get_song_details_with_retry(song_id, max_retries=3, delay=5):
     raise Exception("Max retries reached")  # 最大を超えたら例外をスロー
 
 
-# 総リリース数をカウントする関数
-# 引数: artist_id (SpotifyのアーティストID), release_type (リリースの種類)
-# 戻り値: 総リリース数
-def count_total_releases(artist_id, release_type):
-    sp = get_spotify_client()
+# アーティストのディスコグラフィー (アルバム・シングル・コンピレーション) のキャッシュ
+# 1アーティストにつき1エントリで、一覧ページ・総数・最新アルバムはすべてここから切り出す
+artist_discography_cache = TTLCache(maxsize=256, ttl=60 * 60)
 
-    total_releases = sp.artist_albums(artist_id, include_groups=release_type)["total"]
-    return total_releases
+# ディスコグラフィーで扱うリリースの種類
+RELEASE_TYPES = ("album", "single", "compilation")
 
 
-# アーティストのアルバムとその楽曲をページ単位で取得する関数
-# 引数: artist_id (SpotifyのアーティストID), page (ページ番号), per_page (1ページあたりのアルバム数)
-# 戻り値: アーティストのアルバムと楽曲情報を含む辞書のリスト
-def get_artist_albums_with_songs(artist_id, page, per_page=10):
+# アーティストの全リリースを種類ごとにまとめて取得する
+# 引数: artist_id (SpotifyのアーティストID)
+# 戻り値: 種類 -> リリースのリスト (Spotifyの並び順) の辞書
+def fetch_artist_discography(artist_id):
     sp = get_spotify_client()
-    offset = (page - 1) * per_page
-    limit = per_page
+    discography = {release_type: [] for release_type in RELEASE_TYPES}
 
-    # アーティストのアルバムをページ単位で取得
     # === Spotipy版（現在は非使用、将来バージョンアップ時に再検討） ===
     # 理由：spotipy.artist_albums()がmarket未対応、日本語表記が取得できない
-    #albums = sp.artist_albums(
-    #    artist_id, include_groups="album", offset=offset, limit=limit
-    #)["items"]
+    # albums = sp.artist_albums(artist_id, include_groups="album,single,compilation")
 
     # === 現在使用しているrequests版 ===
-    access_token = sp.auth_manager.get_access_token(as_dict=False)
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
-    params = {
-        "include_groups": "album",
-        "market": "JP",
-        "limit": limit,
-        "offset": offset
-    }
-    url = f"https://api.spotify.com/v1/artists/{artist_id}/albums"
-    response = requests.get(url, headers=headers, params=params)
-    albums = response.json()["items"]
+    offset = 0
+    limit = 50  # 1回のAPI呼び出しで取得できる最大件数
+    while True:
+        page = spotify_get(
+            sp,
+            f"/artists/{artist_id}/albums",
+            {
+                "include_groups": ",".join(RELEASE_TYPES),
+                "market": "JP",
+                "limit": limit,
+                "offset": offset,
+            },
+        )
+        for release in page["items"]:
+            release_type = release.get("album_group") or release["album_type"]
+            if release_type not in discography:
+                continue
+            discography[release_type].append(
+                {
+                    "id": release["id"],
+                    "name": release["name"],
+                    "release_date": release["release_date"],
+                    "total_tracks": release.get("total_tracks"),
+                    "images": release.get("images") or None,  # カバー画像情報
+                    "tracks": None,  # 収録曲 (一覧ページの表示時に取得)
+                }
+            )
+        offset += limit
+        if not page.get("next") or offset >= page["total"]:
+            break
     # === 現在使用しているrequests版 ===
 
-    result = []
+    return discography
 
-    for album in albums:
-        album_info = {
-            "name": album["name"],
-            "release_date": album["release_date"],
-            "tracks": [],
-            "album_id": album["id"],  # アルバムID
-            "artist_id": artist_id,  # アーティストID
-            "total_tracks": album["total_tracks"],  # アルバムの総楽曲数
-            "images": (
-                album["images"] if "images" in album and album["images"] else None
-            ),  # カバー画像情報
-        }
-
-        # 各アルバムに含まれる楽曲を取得
-        album_tracks = sp.album_tracks(album["id"], market="JP")["items"]
-        for track in album_tracks:
-            track_name = track["name"]
-            track_id = track["id"]
-            album_info["tracks"].append({"name": track_name, "track_id": track_id})
 
-        result.append(album_info)
-
-    return result
+def get_artist_discography(artist_id):
+    discography = artist_discography_cache.get(artist_id)
+    if discography is None:
+        discography = fetch_unless_missing(
+            "artist", artist_id, lambda: fetch_artist_discography(artist_id)
+        )
+        artist_discography_cache.set(artist_id, discography)
+    return discography
 
 
-# アーティストのシングルとその楽曲情報を取得
-# 引数: artist_id (SpotifyのアーティストID), page (ページ番号), per_page (1ページあたりのアイテム数)
-# 戻り値: シングル情報とその楽曲を含むリスト
-def get_artist_singles_with_songs(artist_id, page, per_page=10):
-    # Spotifyクライアントの取得
+# リリースの収録曲をまとめて取得し、ディスコグラフィーのエントリに保存する
+# アルバムの一括取得 (最大20件) には先頭50曲が含まれる
+def load_release_tracks(releases):
+    missing = [release for release in releases if release["tracks"] is None]
+    if not missing:
+        return
     sp = get_spotify_client()
-    offset = (page - 1) * per_page
-    limit = per_page
+    for i in range(0, len(missing), 20):
+        batch = missing[i:i + 20]
+        albums = sp.albums([release["id"] for release in batch], market="JP")["albums"]
+        for release, album in zip(batch, albums):
+            if album:
+                album_cache_label(album)  # エクスポート用のレーベルのキャッシュも埋める
+            items = album["tracks"]["items"] if album else []
+            release["tracks"] = [
+                {"name": track["name"], "track_id": track["id"]} for track in items
+            ]
 
-    # アーティストのシングルをページ単位で取得
-    # === Spotipy版（現在は非使用、将来バージョンアップ時に再検討） ===
-    # 理由：spotipy.artist_albums()がmarket未対応、日本語表記が取得できない
-    #singles = sp.artist_albums(
-    #    artist_id, include_groups="single", offset=offset, limit=limit
-    #)["items"]
 
-    # === 現在使用しているrequests版 ===
-    access_token = sp.auth_manager.get_access_token(as_dict=False)
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
-    url = f"https://api.spotify.com/v1/artists/{artist_id}/albums"
-    params = {
-        "include_groups": "single",
-        "market": "JP",
-        "limit": limit,
-        "offset": offset
-    }
-    response = requests.get(url, headers=headers, params=params)
-    singles = response.json()["items"]
-    # === 現在使用しているrequests版 ===
+# アーティストのリリースと楽曲をページ単位で取得する
+# 引数: artist_id (SpotifyのアーティストID), release_type (リリースの種類),
+#       page (ページ番号), per_page (1ページあたりのリリース数)
+# 戻り値: (リリースと楽曲情報を含む辞書のリスト, その種類の総リリース数)
+def get_release_page(artist_id, release_type, page, per_page=10):
+    releases = get_artist_discography(artist_id)[release_type]
+    offset = (page - 1) * per_page
+    page_releases = releases[offset:offset + per_page]
+    load_release_tracks(page_releases)
+
+    result = [
+        {
+            "name": release["name"],
+            "release_date": release["release_date"],
+            "tracks": release["tracks"],
+            f"{release_type}_id": release["id"],  # album_id / single_id / compilation_id
+            "artist_id": artist_id,  # アーティストID
+            "total_tracks": release["total_tracks"],  # 総楽曲数
+            "images": release["images"],
+        }
+        for release in page_releases
+    ]
+    return result, len(releases)
 
-    result = []
 
-    # シングル情報を取得
-    for single in singles:
-        single_info = {
-            "name": single["name"],
-            "release_date": single["release_date"],
-            "tracks": [],
-            "single_id": single["id"],  # シングルIDの追加
-            "artist_id": artist_id,  # アーティストIDの追加
-            "images": (
-                single["images"] if "images" in single and single["images"] else None
-            ),
-        }
+# --- ディスコグラフィーのバックグラウンド取得 ---
+# リリースの多いアーティストでは収録曲の取得に時間がかかるため、上限付きのワーカーで実行し、
+# リクエストにはすぐに待機ページを返す。待機ページは状態APIを確認して、完了したら再読み込みする
+DISCOGRAPHY_WORKERS = int(os.environ.get("DISCOGRAPHY_WORKERS", 2))
+DISCOGRAPHY_JOB_WAIT = float(os.environ.get("DISCOGRAPHY_JOB_WAIT", 0.5))  # 待機ページを返すまでの秒数
+discography_executor = ThreadPoolExecutor(
+    max_workers=DISCOGRAPHY_WORKERS, thread_name_prefix="discography"
+)
+# (アーティストID, 種類, ページ) -> Future。同じページの取得は1つのジョブにまとめる
+discography_jobs = TTLCache(maxsize=512, ttl=10 * 60)
+discography_jobs_lock = Lock()
 
-        # シングルに含まれる楽曲を取得
-        single_tracks = sp.album_tracks(single["id"], market="JP")["items"]
-        for track in single_tracks:
-            track_name = track["name"]
-            track_id = track["id"]
-            single_info["tracks"].append({"name": track_name, "track_id": track_id})
 
-        result.append(single_info)
+# キャッシュ済みのデータだけでページを作れるか (Spotifyへの問い合わせが不要か)
+def release_page_ready(artist_id, release_type, page, per_page):
+    discography = artist_discography_cache.get(artist_id)
+    if discography is None:
+        return False
+    offset = (page - 1) * per_page
+    return all(
+        release["tracks"] is not None
+        for release in discography[release_type][offset:offset + per_page]
+    )
 
-    return result
 
+# ページの取得ジョブを返す。実行中または完了済みのジョブがあればそれを使い、
+# なければ (または前回のジョブが失敗していれば) 新しく登録する
+def get_release_page_job(artist_id, release_type, page, per_page):
+    key = (artist_id, release_type, page)
+    with discography_jobs_lock:
+        job = discography_jobs.get(key)
+        if job is None or (job.done() and job.exception() is not None):
+            job = discography_executor.submit(
+                get_release_page, artist_id, release_type, page, per_page
+            )
+            discography_jobs.set(key, job)
+    return job
 
-# get_artist_compilations_with_songs()
-# アーティストのコンピレーションアルバムとその楽曲を取得
-# 引数: artist_id (SpotifyのアーティストID), page (ページ番号),
-# per_page (1ページ当たりのアイテム数)
-# 戻り値: コンピレーションアルバムとその楽曲情報を含むリスト
-def get_artist_compilations_with_songs(artist_id, page, per_page=10):
-    # Spotifyクライアントを取得
-    sp = get_spotify_client()
 
-    # ページングのためのオフセットとリミットを計算
-    offset = (page - 1) * per_page
-    limit = per_page
+# リリース一覧の1ページを取得する。キャッシュ済みならその場で作り、
+# そうでなければバックグラウンドで取得して DISCOGRAPHY_JOB_WAIT 秒だけ待つ
+# 戻り値: (リリースのリスト, 総リリース数)。取得中の場合はNone (失敗した場合は例外を送出)
+def load_release_page(artist_id, release_type, page, per_page):
+    if release_page_ready(artist_id, release_type, page, per_page):
+        return get_release_page(artist_id, release_type, page, per_page)
 
-    # アーティストのコンピレーションアルバムをページ単位で取得
-    # === Spotipy版（現在は非使用、将来バージョンアップ時に再検討） ===
-    # 理由：spotipy.artist_albums()がmarket未対応、日本語表記が取得できない
-    #compilations = sp.artist_albums(
-    #    artist_id, include_groups="compilation", offset=offset, limit=limit
-    #)["items"]
+    job = get_release_page_job(artist_id, release_type, page, per_page)
+    try:
+        return job.result(timeout=DISCOGRAPHY_JOB_WAIT)
+    except FuturesTimeoutError:
+        return None
 
-    # === 現在使用しているrequests版 ===
-    access_token = sp.auth_manager.get_access_token(as_dict=False)
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
-    url = f"https://api.spotify.com/v1/artists/{artist_id}/albums"
-    params = {
-        "include_groups": "compilation",
-        "market": "JP",
-        "limit": limit,
-        "offset": offset
-    }
-    response = requests.get(url, headers=headers, params=params)
-    compilations = response.json()["items"]
-    # === 現在使用しているrequests版 ===
 
-    result = []
+# 取得中のページの代わりに返す待機ページ
+def release_page_placeholder(artist_id, release_type, page):
+    html = render_template(
+        "release_page_pending.html",
+        artist_id=artist_id,
+        release_type=release_type,
+        page=page,
+        poll_interval=1000,
+    )
+    return html, 202
 
-    # 各コンピレーションアルバムの詳細情報を取得
-    for compilation in compilations:
-        compilation_info = {
-            "name": compilation["name"],  # アルバム名
-            "release_date": compilation["release_date"],  # リリース日
-            "tracks": [],  # 収録曲リスト
-            "compilation_id": compilation["id"],  # コンピレーションID
-            "artist_id": artist_id,  # アーティストID
-            "total_tracks": compilation["total_tracks"],  # 総楽曲数
-            "images": (
-                compilation["images"]
-                if "images" in compilation and compilation["images"]
-                else None
-            ),
-        }
 
-        # 各コンピレーションアルバムに含まれる楽曲を取得
-        compilation_tracks = sp.album_tracks(compilation["id"], market="JP")["items"]
-        for track in compilation_tracks:
-            track_name = track["name"]
-            track_id = track["id"]
-            compilation_info["tracks"].append(
-                {"name": track_name, "track_id": track_id}
-            )
+# 取得に失敗したページの代わりに返すエラーページ (次のリクエストでジョブをやり直す)
+def release_page_error(e):
+    logging.error(f"リリース一覧の取得に失敗しました: {e}")
+    return render_template(
+        "error.html", error="Failed to load releases. Please try again later."
+    )
 
-        result.append(compilation_info)
 
-    return result
+# バックグラウンド取得の状態を返すAPI
+# 戻り値: {"status": "pending" | "ready" | "failed"}
+# ジョブが見つからない場合も、待機ページの再読み込みで取得し直すため "ready" を返す
+@app.route("/api/artist/<artist_id>/<release_type>/page/<int:page>/status")
+def api_release_page_status(artist_id, release_type, page):
+    if release_type not in RELEASE_TYPES:
+        return jsonify({"error": "Unknown release type"}), 404
+    if page < 1:
+        return jsonify({"error": "Invalid page"}), 400
+    job = discography_jobs.get((artist_id, release_type, page))
+    if job is not None and not job.done():
+        status = "pending"
+    elif job is not None and job.exception() is not None:
+        status = "failed"
+    else:
+        status = "ready"
+    return jsonify({"status": status})
 
 
 # アーティスト詳細ページ
 @app.route("/artist/<artist_id>")
 def artist_details(artist_id):
+    sp = get_spotify_client()
+    # 存在しないアーティストは、トップ曲などを取得する前にエラーページを返す
+    try:
+        fetch_unless_missing(
+            "artist", artist_id, lambda: get_cached_artist_details(artist_id, sp)
+        )
+    except Exception as e:
+        if not is_missing_error(e):
+            raise
+        return render_template("error.html", error="Artist not found.")
+
+    # ページに表示する情報 (トップ曲、最新アルバム、関連アーティストなど) がキャッシュに
+    # 揃っていれば、そのハッシュからETagを作成し、変更がなければSpotifyに問い合わせずに304を返す
+    page_data = cached_artist_page_data(artist_id)
+    if page_data is not None:
+        version, last_modified = entity_version("artist", artist_id, page_data)
+        etag = make_etag("artist", artist_id, version, request.query_string)
+        not_modified = conditional_response(etag, last_modified)
+        if not_modified:
+            return not_modified
+
     (
         artist_details,
         top_tracks_details,
         latest_album_details,
         related_artists_details,
         spotify_url,
+        complete,
     ) = get_artist_details(artist_id)
 
+    if page_data is None:
+        # 初回の取得でキャッシュが揃ったので、同じ方法でETagを作成する
+        page_data = cached_artist_page_data(artist_id)
+        if page_data is None:
+            complete = False
+        else:
+            version, last_modified = entity_version("artist", artist_id, page_data)
+            etag = make_etag("artist", artist_id, version, request.query_string)
+
+    # トップ曲と最新アルバムの曲は、プレイリストと同じ条件で並べ替えられる
+    top_tracks_details = sort_artist_tracks(top_tracks_details, request.args)
+    if latest_album_details:
+        latest_album_details = dict(
+            latest_album_details,
+            tracks=sort_artist_tracks(latest_album_details["tracks"], request.args),
+        )
+
     # 取得した情報を使ってテンプレートをレンダリングして返す
-    return render_template(
+    html = render_template(
         "artist_details.html",
         artist=artist_details,
         top_tracks=top_tracks_details,
+        sort=request.args.get("sort"),
+        order=request.args.get("order", "asc"),
         latest_album=latest_album_details,
         related_artists=related_artists_details,
         spotify_url=spotify_url,
     )
+    if not complete:
+        # 一部の情報が欠けたページはキャッシュさせない
+        response = make_response(html)
+        response.cache_control.no_store = True
+        return response
+    return cacheable_response(html, etag, last_modified)
 
 
 # アルバム詳細ページ
 @app.route("/artist/<artist_id>/albums/<album_id>")
 def album_details(artist_id, album_id):
     try:
-        album = get_album_details(album_id)  # 既存の関数でSpotifyからアルバム情報を取得
+        album = cached_get_album_details(album_id)  # キャッシュ経由でアルバム情報を取得
+
+        # アルバム情報のハッシュからETagを作成し、変更がなければ304を返す
+        version, last_modified = entity_version("album", album_id, album)
+        etag = make_etag("album", artist_id, album_id, version)
+        not_modified = conditional_response(etag, last_modified)
+        if not_modified:
+            return not_modified
 
         # アーティスト名を結合してからテンプレートに渡す準備
         artist_names = ", ".join([artist["name"] for artist in album["artists"]])
 
-        return render_template(
+        html = render_template(
             "album_details.html",
             album=album,
             artist_names=artist_names,
         )
+        return cacheable_response(html, etag, last_modified)
 
     except Exception as e:
         return render_template("error.html", error=str(e))
 
 
-@lru_cache(maxsize=32)
-def cached_count_total_releases(artist_id, release_type):
-    return count_total_releases(artist_id, release_type)
-
-
 # 全アルバム表示ページのルーティング処理
 # アーティストIDとページ番号（オプション）を引数として受け取る
-@lru_cache(maxsize=128)
-def cached_get_artist_albums_with_songs(artist_id, page, per_page=10):
-    return get_artist_albums_with_songs(artist_id, page, per_page)
-
-
 @app.route("/artist/<artist_id>/all_albums_and_songs", methods=["GET"])
 @app.route("/artist/<artist_id>/all_albums_and_songs/page/<int:page>", methods=["GET"])
 def all_albums_and_songs_for_artist(artist_id, page=1):
     per_page = 10  # 1ページあたりのアルバム数
-    albums_with_songs = cached_get_artist_albums_with_songs(artist_id, page, per_page)
-
-    # 総アルバム数を取得して、総ページ数を計算
-    total_albums = cached_count_total_releases(artist_id, "album")
+    # ページのアルバムと総アルバム数を取得して、総ページ数を計算
+    try:
+        release_page = load_release_page(artist_id, "album", page, per_page)
+    except Exception as e:
+        return release_page_error(e)
+    if release_page is None:
+        return release_page_placeholder(artist_id, "album", page)
+    albums_with_songs, total_albums = release_page
     total_pages = (total_albums + per_page - 1) // per_page
 
     # レンダリングされたHTMLテンプレートを返す
@@ -1035,21 +3058,18 @@ def all_albums_and_songs_for_artist(artist_id, page=1):
 
 # 全シングル表示ページのルート
 # アーティストIDとページ番号（オプション）を引数として受け取る
-@lru_cache(
-    maxsize=32
-)  # キャッシュのサイズを32に設定します。必要に応じて調整してください。
-def cached_get_artist_singles_with_songs(artist_id, page, per_page):
-    return get_artist_singles_with_songs(artist_id, page, per_page)
-
-
 @app.route("/artist/<artist_id>/all_singles_and_songs", methods=["GET"])
 @app.route("/artist/<artist_id>/all_singles_and_songs/page/<int:page>", methods=["GET"])
 def all_singles_and_songs_for_artist(artist_id, page=1):
     per_page = 10  # 1ページあたりのシングル数
-    singles_with_songs = cached_get_artist_singles_with_songs(artist_id, page, per_page)
-
-    # 総シングル数を取得し、総ページ数を計算
-    total_singles = cached_count_total_releases(artist_id, "single")
+    # ページのシングルと総シングル数を取得し、総ページ数を計算
+    try:
+        release_page = load_release_page(artist_id, "single", page, per_page)
+    except Exception as e:
+        return release_page_error(e)
+    if release_page is None:
+        return release_page_placeholder(artist_id, "single", page)
+    singles_with_songs, total_singles = release_page
     total_pages = (total_singles + per_page - 1) // per_page
 
     # レンダリングされたHTMLテンプレートを返す
@@ -1066,23 +3086,20 @@ def all_singles_and_songs_for_artist(artist_id, page=1):
 
 # 全コンピレーションアルバム表示ページのルーティング処理
 # アーティストIDとページ番号（オプション）を引数として受け取る
-@lru_cache(maxsize=32)
-def cached_get_artist_compilations_with_songs(artist_id, page, per_page=10):
-    return get_artist_compilations_with_songs(artist_id, page, per_page)
-
-
 @app.route("/artist/<artist_id>/all_compilations_and_songs", methods=["GET"])
 @app.route(
     "/artist/<artist_id>/all_compilations_and_songs/page/<int:page>", methods=["GET"]
 )
 def all_compilations_and_songs_for_artist(artist_id, page=1):
     per_page = 10  # 1ページあたりのコンピレーション数
-    compilations_with_songs = cached_get_artist_compilations_with_songs(
-        artist_id, page, per_page
-    )
-
-    # 総コンピレーション数を取得し、総ページ数を計算
-    total_compilations = cached_count_total_releases(artist_id, "compilation")
+    # ページのコンピレーションと総コンピレーション数を取得し、総ページ数を計算
+    try:
+        release_page = load_release_page(artist_id, "compilation", page, per_page)
+    except Exception as e:
+        return release_page_error(e)
+    if release_page is None:
+        return release_page_placeholder(artist_id, "compilation", page)
+    compilations_with_songs, total_compilations = release_page
     total_pages = (total_compilations + per_page - 1) // per_page
 
     # レンダリングされたHTMLテンプレートを返す
@@ -1113,15 +3130,472 @@ def song_details(song_id):
     try:
         song = get_song_details_with_retry(song_id)  # Spotifyから曲情報を取得
 
-        return render_template(
+        # 曲情報のハッシュからETagを作成し、変更がなければ304を返す
+        version, last_modified = entity_version("track", song_id, song)
+        etag = make_etag("track", song_id, version)
+        not_modified = conditional_response(etag, last_modified)
+        if not_modified:
+            return not_modified
+
+        html = render_template(
             "song_details.html",
             song=song,
             song_id=song_id,
         )
+        return cacheable_response(html, etag, last_modified)
+
+    except Exception as e:
+        return render_template("error.html", error=str(e))
+
+
+# 関連アーティストの探索API
+# クエリパラメータ: hops (たどる回数、1〜3)
+# 戻り値: 距離ごとのアーティスト ({"name", "id"}) のリストを含むJSON
+@app.route("/api/artist/<artist_id>/explore", methods=["GET"])
+def api_explore_artists(artist_id):
+    hops = min(max(request.args.get("hops", 2, type=int), 1), 3)
+    sp = get_spotify_client()
+    try:
+        # 起点のアーティスト名をグラフに保持させるため、基本情報をキャッシュに載せておく
+        fetch_unless_missing(
+            "artist", artist_id, lambda: get_cached_artist_details(artist_id, sp)
+        )
+        layers = artist_graph.explore(sp, artist_id, hops)
+    except Exception as e:
+        if is_missing_error(e):
+            return jsonify({"error": "Artist not found"}), 404
+        logging.error(f"Failed to explore related artists: {e}")
+        return jsonify({"error": "Failed to load related artists"}), 502
+    return jsonify(
+        {
+            "artist": artist_graph.describe(artist_id),
+            "hops": [
+                {"hop": hop, "artists": [artist_graph.describe(a) for a in layer]}
+                for hop, layer in enumerate(layers, start=1)
+            ],
+        }
+    )
+
+
+# 2人のアーティストを関連アーティストでつなぐ最短経路のAPI
+# クエリパラメータ: from, to (アーティストID)
+@app.route("/api/artist_path", methods=["GET"])
+def api_artist_path():
+    source_id = request.args.get("from")
+    target_id = request.args.get("to")
+    if not source_id or not target_id:
+        return jsonify({"error": "from and to are required"}), 400
+    sp = get_spotify_client()
+    try:
+        # 起点のアーティスト名をグラフに保持させるため、基本情報をキャッシュに載せておく
+        fetch_unless_missing(
+            "artist", source_id, lambda: get_cached_artist_details(source_id, sp)
+        )
+        path = artist_graph.shortest_path(sp, source_id, target_id)
+    except Exception as e:
+        if is_missing_error(e):
+            return jsonify({"error": "Artist not found"}), 404
+        logging.error(f"Failed to find artist path: {e}")
+        return jsonify({"error": "Failed to load related artists"}), 502
+    if path is None:
+        return jsonify({"error": "No path found", "path": None}), 404
+    return jsonify({"path": [artist_graph.describe(a) for a in path]})
+
+
+# 一度に比較できる最大曲数 (トラック・オーディオ特性の一括取得の上限)
+MAX_COMPARE_TRACKS = 50
+
+
+# SpotifyのIDに使われる文字 (22文字のbase62)
+SPOTIFY_ID_CHARS = frozenset(
+    "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+)
+
+
+def is_spotify_id(value):
+    return len(value) == 22 and all(char in SPOTIFY_ID_CHARS for char in value)
+
+
+# クエリパラメータ ids (カンマ区切りのトラックID) を重複なしのリストにする
+# 不正なIDが1つでもあると一括取得全体が400になるため、問い合わせる前に取り除く
+# 戻り値: (有効なトラックIDのリスト, 不正なIDのリスト)
+def parse_compare_ids(value):
+    track_ids = []
+    invalid_ids = []
+    for track_id in (value or "").split(","):
+        track_id = track_id.strip()
+        if not track_id or track_id in track_ids or track_id in invalid_ids:
+            continue
+        (track_ids if is_spotify_id(track_id) else invalid_ids).append(track_id)
+    return track_ids, invalid_ids
+
+
+# 複数の曲の詳細を、トラック情報とオーディオ特性の一括取得でまとめて作成する
+# 戻り値: (楽曲詳細のリスト (指定順), 見つからなかったトラックIDのリスト)
+def get_compare_songs(track_ids):
+    sp = get_spotify_client()
+    tracks = get_cached_tracks(sp, track_ids)
+    audio_features = get_tracks_audio_features(list(tracks))
+    songs = []
+    missing = []
+    for track_id in track_ids:
+        if track_id in tracks and track_id in audio_features:
+            songs.append(build_song_details(tracks[track_id], audio_features[track_id]))
+        else:
+            missing.append(track_id)
+    return songs, missing
+
+
+# 楽曲比較ページのルート
+# クエリパラメータ: ids (カンマ区切りのトラックID、最大50曲)
+@app.route("/compare", methods=["GET"])
+def compare():
+    track_ids, invalid_ids = parse_compare_ids(request.args.get("ids"))
+    if not track_ids:
+        return render_template("error.html", error="No valid track IDs provided.")
+    if len(track_ids) > MAX_COMPARE_TRACKS:
+        return render_template(
+            "error.html", error=f"Up to {MAX_COMPARE_TRACKS} tracks can be compared."
+        )
+
+    try:
+        songs, missing = get_compare_songs(track_ids)
+    except Exception as e:
+        logging.error(f"Failed to compare tracks: {e}")
+        return render_template(
+            "error.html", error="Failed to load tracks. Please try again later."
+        )
+    return render_template("compare.html", songs=songs, missing=invalid_ids + missing)
+
+
+# 楽曲比較のAPI
+# クエリパラメータ: ids (カンマ区切りのトラックID、最大50曲)
+# 戻り値: 楽曲詳細のリストと、見つからなかったトラックIDを含むJSON
+@app.route("/api/compare", methods=["GET"])
+def api_compare():
+    track_ids, invalid_ids = parse_compare_ids(request.args.get("ids"))
+    if not track_ids and not invalid_ids:
+        return jsonify({"error": "No track IDs provided"}), 400
+    if not track_ids:
+        return jsonify({"songs": [], "missing": invalid_ids})
+    if len(track_ids) > MAX_COMPARE_TRACKS:
+        return jsonify({"error": f"Up to {MAX_COMPARE_TRACKS} tracks"}), 400
+
+    try:
+        songs, missing = get_compare_songs(track_ids)
+    except Exception as e:
+        logging.error(f"Failed to compare tracks: {e}")
+        return jsonify({"error": "Failed to load tracks"}), 502
+    return jsonify({"songs": songs, "missing": invalid_ids + missing})
+
+
+# --- プレイリストの統計 ---
+# 集計結果はプレイリストのsnapshot_idごとにキャッシュする (内容が変わればsnapshot_idも変わる)
+playlist_stats_cache = TTLCache(maxsize=256, ttl=24 * 60 * 60)
+STATS_BPM_BIN = 10  # BPMのヒストグラムの幅
+STATS_PERCENTILES = (10, 25, 50, 75, 90)  # popularityの分位点
+
+
+# 昇順に並んだ値の分位数 (最も近い順位の値)。値がなければNone
+def nearest_rank(sorted_values, percent):
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(percent / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+# 整形済みトラックとオーディオ特性からプレイリストの統計を計算する
+# numpyは使わず標準ライブラリで1回ずつ走査する (最大MAX_TRACKS曲のため十分に速い)
+def compute_playlist_stats(rows, features):
+    tempos = [row["tempo"] for row in rows if isinstance(row["tempo"], (int, float))]
+    popularity = sorted(row["popularity"] for row in rows)
+    energy = [features[row["id"]]["energy"] for row in rows if row["id"] in features]
+    valence = [features[row["id"]]["valence"] for row in rows if row["id"] in features]
+
+    # BPMのヒストグラム (空のビンも含めて連続させる)
+    bpm_bins = defaultdict(int)
+    for tempo in tempos:
+        bpm_bins[int(tempo // STATS_BPM_BIN) * STATS_BPM_BIN] += 1
+    bpm_histogram = [
+        {"min": low, "max": low + STATS_BPM_BIN, "count": bpm_bins[low]}
+        for low in range(
+            min(bpm_bins, default=0), max(bpm_bins, default=-1) + 1, STATS_BPM_BIN
+        )
+    ]
+
+    # キャメロットキーの分布 (ホイールの順)
+    camelot_counts = defaultdict(int)
+    for row in rows:
+        camelot_counts[row["camelot_key_signature"]] += 1
+    camelot_distribution = [
+        {"key": key, "color": color, "count": camelot_counts[key]}
+        for key, color in camelot_colors.items()
+    ]
+
+    # popularityの分位数
+    popularity_percentiles = {
+        f"p{percent}": nearest_rank(popularity, percent) for percent in STATS_PERCENTILES
+    }
+
+    return {
+        "track_count": len(rows),
+        "bpm": {
+            "histogram": bpm_histogram,
+            "mean": round(statistics.fmean(tempos), 1) if tempos else None,
+            "median": round(statistics.median(tempos), 1) if tempos else None,
+        },
+        "camelot": camelot_distribution,
+        "energy_mean": round(statistics.fmean(energy), 3) if energy else None,
+        "valence_mean": round(statistics.fmean(valence), 3) if valence else None,
+        "popularity": popularity_percentiles,
+    }
+
+
+# プレイリストの統計を取得する (整形済みトラックはキャッシュを再利用する)
+# 戻り値: (統計の辞書, トラックリスト)
+def get_playlist_stats(sp, playlist_id):
+    tracks = load_playlist_tracks(sp, playlist_id, refresh=False)
+    key = (playlist_id, tracks.version)
+    stats = playlist_stats_cache.get(key)
+    if stats is None:
+        rows = tracks.all()
+        features = get_tracks_audio_features([row["id"] for row in rows])
+        stats = compute_playlist_stats(rows, features)
+        stats["exceeds_max_tracks"] = tracks.meta["exceeds_max_tracks"]
+        playlist_stats_cache.set(key, stats)
+    return stats, tracks
+
+
+# プレイリストの統計ページ
+@app.route("/playlist/<playlist_id>/stats", methods=["GET"])
+def playlist_stats(playlist_id):
+    try:
+        sp = get_spotify_client()
+        stats, tracks = get_playlist_stats(sp, playlist_id)
+    except Exception as e:
+        if is_missing_error(e):
+            return render_template(
+                "error.html",
+                error="Invalid or private playlist ID."
+                "Please confirm your playlist ID or make it public.",
+            )
+        return render_template("error.html", error=str(e))
+
+    version, last_modified = entity_version("playlist", playlist_id, tracks.version)
+    etag = make_etag("playlist_stats", playlist_id, version)
+    not_modified = conditional_response(etag, last_modified)
+    if not_modified:
+        return not_modified
+
+    html = render_template(
+        "playlist_stats.html",
+        stats=stats,
+        playlist=tracks.meta,
+        playlist_id=playlist_id,
+        max_tracks=MAX_TRACKS,
+    )
+    return cacheable_response(html, etag, last_modified)
+
+
+# プレイリストの統計のAPI
+@app.route("/api/playlist/<playlist_id>/stats", methods=["GET"])
+def api_playlist_stats(playlist_id):
+    try:
+        sp = get_spotify_client()
+        stats, _ = get_playlist_stats(sp, playlist_id)
+    except Exception as e:
+        if is_missing_error(e):
+            return jsonify({"error": "Playlist not found"}), 404
+        logging.error(f"Failed to compute playlist stats: {e}")
+        return jsonify({"error": "Failed to load tracks"}), 502
+    return jsonify(stats)
+
+
+# --- プレイリストのエクスポート ---
+# csvjson.json (プレイリストのエクスポートツールの形式) と同じ列に、Camelotを加えて出力する
+EXPORT_COLUMNS = [
+    "Track URI",
+    "Track Name",
+    "Album Name",
+    "Artist Name(s)",
+    "Release Date",
+    "Duration (ms)",
+    "Popularity",
+    "Explicit",
+    "Added By",
+    "Added At",
+    "Genres",
+    "Record Label",
+    "Danceability",
+    "Energy",
+    "Key",
+    "Loudness",
+    "Mode",
+    "Speechiness",
+    "Acousticness",
+    "Instrumentalness",
+    "Liveness",
+    "Valence",
+    "Tempo",
+    "Time Signature",
+    "Camelot",
+]
+EXPORT_MAX_TRACKS = int(os.environ.get("EXPORT_MAX_TRACKS", 10000))  # エクスポートする最大曲数
+EXPORT_CHUNK_TRACKS = 100  # オーディオ特性をまとめて参照する曲数
+
+
+# 整形済みトラックとオーディオ特性、レーベルから、エクスポートの1行 (列名 -> 値) を作成する
+def export_row(track_info, features, label=""):
+    return {
+        "Track URI": f"spotify:track:{track_info['id']}",
+        "Track Name": track_info["name"],
+        "Album Name": track_info.get("album_name", ""),
+        "Artist Name(s)": track_info.get("artist_names", track_info["artist"]),
+        "Release Date": track_info.get("release_date", ""),
+        "Duration (ms)": track_info.get("duration_ms"),
+        "Popularity": track_info["popularity"],
+        "Explicit": track_info.get("explicit", False),
+        "Added By": track_info.get("added_by"),
+        "Added At": track_info.get("added_at"),
+        "Genres": ",".join(track_info.get("genres") or []),
+        "Record Label": label,
+        "Danceability": features.get("danceability"),
+        "Energy": features.get("energy"),
+        "Key": features.get("key"),
+        "Loudness": features.get("loudness"),
+        "Mode": features.get("mode"),
+        "Speechiness": features.get("speechiness"),
+        "Acousticness": features.get("acousticness"),
+        "Instrumentalness": features.get("instrumentalness"),
+        "Liveness": features.get("liveness"),
+        "Valence": features.get("valence"),
+        "Tempo": features.get("tempo"),
+        "Time Signature": features.get("time_signature"),
+        "Camelot": track_info["camelot_key_signature"],
+    }
+
+
+# プレイリストの整形済みトラックを一定数ずつ返す
+# 先頭のMAX_TRACKS曲は一覧ページと共有するトラックリスト (tracks) から取り出し、
+# それを超える分だけパイプラインから直接取り出す (保持しないためメモリ使用量は一定)
+# 引数: tracks (load_playlist_tracksが返すトラックリスト)
+def iter_export_chunks(sp, playlist_id, tracks):
+    offset = 0
+    while offset < EXPORT_MAX_TRACKS:
+        chunk = tracks.slice(offset, min(offset + EXPORT_CHUNK_TRACKS, EXPORT_MAX_TRACKS))
+        if not chunk:
+            break
+        yield chunk
+        offset += len(chunk)
+    if not tracks.meta["exceeds_max_tracks"] or EXPORT_MAX_TRACKS <= MAX_TRACKS:
+        return
+
+    # エクスポートだけで読む曲は、楽曲詳細ページ用のキャッシュに入れない
+    pages = iter_playlist_pages(sp, playlist_id, max_tracks=EXPORT_MAX_TRACKS, start=MAX_TRACKS)
+    chunk = []
+    for track_info in iter_track_rows(sp, pages, seed_cache=False):
+        chunk.append(track_info)
+        if len(chunk) >= EXPORT_CHUNK_TRACKS:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# エクスポートの行を1行ずつ返す
+# オーディオ特性はトラック取得時にキャッシュしたものを参照する
+# レーベルはアルバムの一括取得で補う (取得できなければ空欄のまま出力を続ける)
+def iter_export_rows(sp, playlist_id, tracks):
+    for chunk in iter_export_chunks(sp, playlist_id, tracks):
+        features = get_tracks_audio_features([track_info["id"] for track_info in chunk])
+        try:
+            labels = get_album_labels(sp, [track_info.get("album_id") for track_info in chunk])
+        except Exception as e:
+            logging.warning(f"アルバムのレーベルを取得できませんでした: {e}")
+            labels = {}
+        for track_info in chunk:
+            yield export_row(
+                track_info,
+                features.get(track_info["id"], {}),
+                labels.get(track_info.get("album_id"), ""),
+            )
+
+
+# CSVの値に変換する。真偽値はcsvjson.json (およびJSONのエクスポート) と同じく小文字にする
+def csv_value(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
+
+
+def stream_export_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({column: csv_value(value) for column, value in row.items()})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def stream_export_json(rows):
+    # csvjson.jsonと同じく、行オブジェクトの配列として出力する
+    yield "["
+    separator = "\n  "
+    for row in rows:
+        yield separator + json.dumps(row, ensure_ascii=False)
+        separator = ",\n  "
+    yield "\n]\n"
+
 
+# エクスポートが途中で失敗したときに末尾に付ける印
+# JSONは閉じていない配列の後に置くことで、意図的に解析できない出力にする
+EXPORT_INCOMPLETE_MARKERS = {
+    "csv": "# ERROR: export incomplete\n",
+    "json": "\n// ERROR: export incomplete\n",
+}
+
+
+# プレイリストのエクスポート
+# 引数: playlist_id (SpotifyのプレイリストID), file_format ("csv" または "json")
+@app.route("/export/<playlist_id>.<file_format>", methods=["GET"])
+def export_playlist(playlist_id, file_format):
+    if file_format not in ("csv", "json") or not playlist_id.isalnum():
+        abort(404)
+
+    sp = get_spotify_client()
+    try:
+        # ストリーミングを始める前に、存在しないプレイリストを検出する
+        # トラックの取得は一覧ページと同じトラックリストを共有する
+        tracks = load_playlist_tracks(sp, playlist_id)
     except Exception as e:
+        if is_missing_error(e):
+            return render_template(
+                "error.html",
+                error="Invalid or private playlist ID."
+                "Please confirm your playlist ID or make it public.",
+            )
         return render_template("error.html", error=str(e))
 
+    def generate():
+        rows = iter_export_rows(sp, playlist_id, tracks)
+        stream = stream_export_csv(rows) if file_format == "csv" else stream_export_json(rows)
+        try:
+            yield from stream
+        except Exception as e:
+            # 送信を始めた後はエラーページに切り替えられないため、出力を打ち切り、
+            # 途中までの出力であることを末尾に示す
+            logging.error(f"プレイリストのエクスポート中にエラーが発生しました: {e}")
+            yield EXPORT_INCOMPLETE_MARKERS[file_format]
+
+    mimetype = "text/csv" if file_format == "csv" else "application/json"
+    response = Response(stream_with_context(generate()), mimetype=mimetype)
+    response.headers["Content-Disposition"] = (
+        f'attachment; filename="{playlist_id}.{file_format}"'
+    )
+    return response
+
 
 # キーワードでプレイリストを検索する新しいルート
 @app.route("/search_playlist", methods=["GET"])
@@ -1130,6 +3604,9 @@ def search_playlist():
     if not keyword:
         return jsonify({"error": "No keyword provided"}), 400
 
+    if is_known_missing("playlist_search", keyword):
+        return jsonify({"error": "No playlists found"}), 404
+
     sp = get_spotify_client()
 
     # Spotify APIでキーワードでプレイリストを検索
@@ -1139,6 +3616,7 @@ def search_playlist():
         or not results.get("playlists")
         or not results["playlists"].get("items")
     ):
+        remember_missing("playlist_search", keyword)
         return jsonify({"error": "No playlists found"}), 404
 
     playlist = results["playlists"]["items"][0]
@@ -1154,11 +3632,15 @@ def search_artist():
     if not keyword:
         return jsonify({"error": "No keyword provided"}), 400
 
+    if is_known_missing("artist_search", keyword):
+        return jsonify({"error": "No artists found"}), 404
+
     sp = get_spotify_client()
 
     # Spotify APIでキーワードでアーティストを検索
     results = sp.search(q=keyword, type="artist", limit=1, market="JP")
     if not results or not results.get("artists") or not results["artists"].get("items"):
+        remember_missing("artist_search", keyword)
         return jsonify({"error": "No artists found"}), 404
 
     artist = results["artists"]["items"][0]
@@ -1175,11 +3657,15 @@ def search_album():
     if not keyword:
         return jsonify({"error": "No keyword provided"}), 400
 
+    if is_known_missing("album_search", keyword):
+        return jsonify({"error": "No albums found"}), 404
+
     sp = get_spotify_client()
 
     # Spotify APIでキーワードでアルバムを検索
     results = sp.search(q=keyword, type="album", limit=1, market="JP")
     if not results or not results.get("albums") or not results["albums"].get("items"):
+        remember_missing("album_search", keyword)
         return jsonify({"error": "No albums found"}), 404
 
     album = results["albums"]["items"][0]
@@ -1190,6 +3676,198 @@ def search_album():
     return jsonify({"album_id": album_id, "artist_id": artist_id})
 
 
+# キャッシュの利用状況を返す
+# ネガティブキャッシュについては、種類ごとに省略したAPI呼び出しの回数を含む
+@app.route("/cache_stats", methods=["GET"])
+def cache_stats():
+    caches = {
+        "hydrated_tracks": hydrated_tracks,
+        "row_fragments": row_fragment_cache,
+        "album_details": album_details_cache,
+        "playlist_stats": playlist_stats_cache,
+        "artist_discography": artist_discography_cache,
+        "artist_top_tracks": artist_top_tracks_cache,
+        "artists": artist_cache,
+        "artist_genres": artist_genre_cache,
+        "album_labels": album_label_cache,
+        "tracks": track_cache,
+        "audio_features": audio_features_cache,
+        "entity_versions": entity_versions,
+        "negative": negative_cache,
+    }
+    return jsonify(
+        {
+            "caches": {
+                name: {"size": len(cache), "hits": cache.hits, "misses": cache.misses}
+                for name, cache in caches.items()
+            },
+            "artist_graph": {"artists": len(artist_graph)},
+            "negative": {
+                "ttl": NEGATIVE_CACHE_TTL,
+                "absorbed": dict(negative_cache_hits),
+                "stored": dict(negative_cache_stores),
+            },
+        }
+    )
+
+
+# --- キャッシュのスナップショット ---
+# CACHE_SNAPSHOT_PATHを設定すると、よく使うキャッシュを有効期限付きでgzip圧縮のJSONに保存し、
+# 再起動後に復元する。再起動直後にSpotify APIへのリクエストが集中するのを防ぐ
+CACHE_SNAPSHOT_PATH = os.environ.get("CACHE_SNAPSHOT_PATH")
+CACHE_SNAPSHOT_INTERVAL = int(os.environ.get("CACHE_SNAPSHOT_INTERVAL", 5 * 60))  # 秒
+CACHE_SNAPSHOT_VERSION = 2  # 形式を変えたら上げる (古いスナップショットは読み込まない)
+snapshot_lock = Lock()
+final_snapshot_written = False  # 終了時のスナップショットを保存済みかどうか
+
+
+# 全件取得済みのトラックリストだけを保存する (取得途中のものは再起動後に取り直す)
+def encode_track_list(tracks):
+    if not tracks.complete or tracks.failed:
+        return None
+    return {"meta": tracks.meta, "version": tracks.version, "rows": tracks.all()}
+
+
+def decode_track_list(value):
+    return LazyTrackList.from_rows(value["rows"], value["meta"], value["version"])
+
+
+# スナップショットの対象: キャッシュの変数名 -> (保存用の変換, 復元用の変換)
+SNAPSHOT_CACHES = {
+    "hydrated_tracks": (encode_track_list, decode_track_list),
+    "track_cache": (None, None),
+    "audio_features_cache": (None, None),
+    "artist_cache": (None, None),
+    "artist_genre_cache": (None, None),
+    "album_label_cache": (None, None),
+    "entity_versions": (None, None),
+}
+
+
+def write_cache_snapshot(path=None):
+    path = path or CACHE_SNAPSHOT_PATH
+    if not path:
+        return
+    snapshot = {
+        "version": CACHE_SNAPSHOT_VERSION,
+        "template_version": TEMPLATE_VERSION,
+        "written_at": time.time(),
+        "caches": {},
+    }
+    for name, (encode, _) in SNAPSHOT_CACHES.items():
+        entries = []
+        for key, value, stored_at, expires_at in globals()[name].entries():
+            if encode is not None:
+                value = encode(value)
+                if value is None:
+                    continue
+            entries.append([key, value, stored_at, expires_at])
+        snapshot["caches"][name] = entries
+    snapshot["artist_graph"] = artist_graph.to_dict()
+
+    # 書き込み途中のファイルを読まれないよう、一時ファイルに書いてから置き換える
+    # 複数のワーカープロセスが同時に保存しても衝突しない一時ファイル名にする
+    with snapshot_lock:
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(path) or ".",
+                prefix=f".{os.path.basename(path)}.",
+                suffix=".tmp",
+            )
+            with os.fdopen(fd, "wb") as raw, gzip.open(
+                raw, "wt", encoding="utf-8", compresslevel=COMPRESS_LEVEL
+            ) as f:
+                json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.error(f"キャッシュのスナップショットを保存できませんでした: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+# 終了時のスナップショットを1回だけ保存する (SIGTERMのハンドラーとatexitの両方から呼ばれる)
+def write_final_snapshot():
+    global final_snapshot_written
+    with snapshot_lock:
+        if final_snapshot_written:
+            return
+        final_snapshot_written = True
+    write_cache_snapshot()
+
+
+def restore_cache_snapshot(path=None):
+    path = path or CACHE_SNAPSHOT_PATH
+    if not path or not os.path.exists(path):
+        return 0
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.error(f"キャッシュのスナップショットを読み込めませんでした: {e}")
+        return 0
+    if snapshot.get("version") != CACHE_SNAPSHOT_VERSION:
+        return 0
+
+    restored = 0
+    same_templates = snapshot.get("template_version") == TEMPLATE_VERSION
+    for name, entries in snapshot["caches"].items():
+        if name not in SNAPSHOT_CACHES:
+            continue
+        # テンプレートが変わった場合、ETag用のバージョンは引き継がない
+        if name == "entity_versions" and not same_templates:
+            continue
+        _, decode = SNAPSHOT_CACHES[name]
+        cache = globals()[name]
+        # restoreは最も古い位置に挿入するため、新しい順に戻して元の順序を保つ
+        for key, value, stored_at, expires_at in reversed(entries):
+            # JSONではタプルがリストになるため戻す
+            key = tuple(key) if isinstance(key, list) else key
+            if name == "entity_versions":
+                value = tuple(value)
+            if cache.restore(key, decode(value) if decode else value, stored_at, expires_at):
+                restored += 1
+    if snapshot.get("artist_graph"):
+        artist_graph.load(snapshot["artist_graph"])
+    logging.info(f"キャッシュのスナップショットから{restored}件を復元しました")
+    return restored
+
+
+# 一定間隔でスナップショットを保存する
+def snapshot_periodically():
+    while True:
+        time.sleep(CACHE_SNAPSHOT_INTERVAL)
+        write_cache_snapshot()
+
+
+# 起動時にスナップショットを復元し、定期保存と終了時の保存を設定する
+# 復元はバックグラウンドで行い、起動を待たせない (復元前のリクエストは通常どおり取得する)
+def start_cache_snapshots():
+    threading.Thread(target=restore_cache_snapshot, daemon=True).start()
+    if CACHE_SNAPSHOT_INTERVAL > 0:
+        threading.Thread(target=snapshot_periodically, daemon=True).start()
+    atexit.register(write_final_snapshot)
+
+    # SIGTERMでもatexitの処理が動くように、既存のハンドラーの前に終了処理を挟む
+    previous_handler = signal.getsignal(signal.SIGTERM)
+
+    def handle_sigterm(signum, frame):
+        if callable(previous_handler):
+            write_final_snapshot()
+            previous_handler(signum, frame)
+        elif previous_handler != signal.SIG_IGN:
+            raise SystemExit(0)  # atexitでスナップショットを保存する
+
+    try:
+        signal.signal(signal.SIGTERM, handle_sigterm)
+    except ValueError:
+        pass  # メインスレッド以外から読み込まれた場合は設定できない
+
+
+if CACHE_SNAPSHOT_PATH:
+    start_cache_snapshots()
+
+
 # メインのエントリーポイント
 # スクリプトが直接実行された場合に以下のコードが実行される
 if __name__ == "__main__":